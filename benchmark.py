@@ -0,0 +1,278 @@
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+from panda3d.core import ClockObject, Point3, TransformState
+
+from game import Game
+from game_events import ROUND_WON
+from profiler import profiler
+
+BASELINE_FILE = "benchmark_baseline.json"
+
+# name -> bottles on synthetic mounts, pellets fired per second, bottles broken at once every break_interval seconds
+SCENARIOS = {
+    "idle_256": {"bottles": 256, "shots_per_second": 0, "multi_break": 0, "break_interval": 1.0},
+    "shots_64_5hz": {"bottles": 64, "shots_per_second": 5, "multi_break": 0, "break_interval": 1.0},
+    "shots_256_20hz": {"bottles": 256, "shots_per_second": 20, "multi_break": 0, "break_interval": 1.0},
+    "multi_break_64x8": {"bottles": 64, "shots_per_second": 0, "multi_break": 8, "break_interval": 1.0},
+    "multi_break_256x32": {"bottles": 256, "shots_per_second": 0, "multi_break": 32, "break_interval": 2.0},
+}
+
+# Metrics compared against the baseline; all are "lower is better"
+CHECKED_METRICS = ("frame_ms.p50", "frame_ms.p99", "fracture_latency_ms.p99", "live_bodies.max")
+
+# A metric regresses when it exceeds baseline * (1 + ratio) + slack. Timings are loose, since
+# p99 of a 10 s run is only its few worst frames; fracture latency is looser still, as it is a
+# queue wait that swings several-fold between runs; body counts are deterministic for a seed.
+DEFAULT_TOLERANCE = {"ratio": 1.0, "slack_ms": 2.0, "latency_ratio": 2.0, "latency_slack_ms": 100.0,
+                     "body_ratio": 0.1}
+
+
+def percentiles(values):
+    """mean/p50/p99/max of a list of samples (all zero when empty)."""
+    if len(values) == 0:
+        return {"mean": 0.0, "p50": 0.0, "p99": 0.0, "max": 0.0}
+    values = np.asarray(values, dtype=float)
+    p50, p99 = np.percentile(values, (50, 99))
+    return {"mean": float(values.mean()), "p50": float(p50), "p99": float(p99), "max": float(values.max())}
+
+
+def get_metric(result, path):
+    value = result
+    for key in path.split("."):
+        value = value[key]
+    return value
+
+
+class Benchmark:
+    """
+    Runs scripted scenarios in one headless, seeded Game: the town's bottles
+    are replaced by N bottles on a synthetic grid of mounts, pellets are fired
+    at random live bottles M times a second through the projectile system, and
+    volleys of bottles are broken in the same frame. Every scenario starts from
+    an empty debris pool and fresh profiler windows.
+    """
+
+    def __init__(self, seed=1, frame_rate=60, warmup_ticks=30, origin=Point3(0, -20, 5), spacing=6.0,
+                 row_length=16, distance=40.0):
+        self.seed = seed
+        self.frame_rate = frame_rate
+        self.warmup_ticks = warmup_ticks  # Unmeasured frames after placing the bottles
+        self.origin = origin  # Where the pellets are fired from
+        self.spacing = spacing
+        self.row_length = row_length
+        self.distance = distance  # Mount grid distance in front of the origin
+        self.game = Game(headless=True, seed=seed)
+        # Round resets and the win music would fire in the middle of a scenario
+        self.game.hud.stop_timer()
+        self.game.bgm_player.ignore(ROUND_WON)
+        # Seeded for a reproducible scene, but fractures commit under the game's per-frame time
+        # budget: spreading a volley over frames is part of what fracture latency and frame
+        # times measure here, so commit timing follows frame speed as it does in play
+        self.game.physics.fracture_jobs.deterministic = False
+        self.mounts = None
+        self.placed = []  # (bottle, transform, color scale) as placed, for restore_bottles()
+
+    def clear_scene(self):
+        game = self.game
+        game.physics.reset()
+        game.gun.reset()
+        game.hit_dispatcher.clear()
+        game.bottle_manager.clear_bottles()
+        game.hud.bottles_total = 0
+        game.hud.reset()
+        # Let the fracture workers' cancelled jobs and the pruned bodies settle before measuring
+        game.taskMgr.step()
+
+    def place_bottles(self, count):
+        """Put `count` bottles on a grid of mounts facing the pellet origin."""
+        game = self.game
+        if self.mounts is not None:
+            self.mounts.removeNode()
+        self.mounts = game.render.attachNewNode("benchmark_mounts")
+        for i in range(count):
+            row, column = divmod(i, self.row_length)
+            mount = self.mounts.attachNewNode(f"bottle_mount_{i}")
+            mount.setPos(self.origin.x + (column - self.row_length / 2) * self.spacing,
+                         self.origin.y + self.distance + row * 2.0,
+                         self.origin.z + row * self.spacing / 2)
+        game.bottle_manager.place_bottles_in_model(self.mounts)
+        game.bottle_manager.lights.refresh()
+        self.placed = [(bottle, bottle.node.getTransform(), bottle.node.getColorScale())
+                       for bottle in game.bottle_manager.bottles]
+
+    def restore_bottles(self):
+        """Put every broken bottle back on its mount, so a scenario keeps its load for the whole run."""
+        bottle_manager = self.game.bottle_manager
+        for bottle, transform, color_scale in self.placed:
+            if bottle.destroyed:
+                bottle.restore(transform, color_scale)
+        bottle_manager.bottles = [bottle for bottle, _, _ in self.placed]
+        bottle_manager.lights.refresh()
+
+    def fire_at(self, bottle):
+        target = bottle.node.getPos(self.game.render)
+        direction = (target - self.origin).normalized()
+        self.game.gun.projectiles.fire(TransformState.makePos(self.origin), direction)
+
+    def run_scenario(self, name, bottles, shots_per_second, multi_break, break_interval, ticks):
+        game = self.game
+        random.seed(self.seed)
+        np.random.seed(self.seed)
+        self.clear_scene()
+        self.place_bottles(bottles)
+
+        clock = ClockObject.getGlobalClock()
+        clock.setMode(ClockObject.MNonRealTime)
+        clock.setFrameRate(self.frame_rate)
+        for _ in range(self.warmup_ticks):
+            game.taskMgr.step()
+        gc.collect()  # Don't charge the previous scenario's garbage to this one
+
+        profiler.reset()
+        game.physics.fracture_jobs.latency_ms.clear()
+        fired_start = game.gun.projectiles.fired
+        committed_start = game.physics.fracture_jobs.committed
+
+        frame_ms = np.zeros(ticks)
+        physics_ms = np.zeros(ticks)
+        live_bodies = np.zeros(ticks, dtype=int)
+        shot_credit = 0.0
+        break_every = max(1, int(round(break_interval * self.frame_rate)))
+        skipped_shots = 0
+        restores = 0
+        for i in range(ticks):
+            live = [bottle for bottle in game.bottle_manager.bottles if not bottle.destroyed]
+            if (shots_per_second or multi_break) and len(live) < max(multi_break, 1):
+                # Out of targets (a pellet can break more than one bottle on its way): start over
+                self.restore_bottles()
+                restores += 1
+                live = list(game.bottle_manager.bottles)
+            shot_credit += shots_per_second / self.frame_rate
+            while shot_credit >= 1.0:
+                shot_credit -= 1.0
+                if live:
+                    self.fire_at(random.choice(live))
+                else:
+                    skipped_shots += 1
+            if multi_break and i % break_every == 0:
+                # A volley: several bottles broken in the same frame
+                for bottle in random.sample(live, min(multi_break, len(live))):
+                    game.gun.hit_bottle(bottle, bottle.node.getPos(game.render))
+
+            start = time.perf_counter()
+            game.taskMgr.step()
+            frame_ms[i] = (time.perf_counter() - start) * 1000.0
+            physics_ms[i] = game.physics.stepper.last_step_ms
+            live_bodies[i] = game.bullet_world.getNumRigidBodies()
+
+        sections = profiler.get_stats()["sections"]
+        return {
+            "scenario": name,
+            "bottles": bottles,
+            "shots_per_second": shots_per_second,
+            "multi_break": multi_break,
+            "ticks": ticks,
+            "frame_ms": percentiles(frame_ms),
+            "physics_ms": percentiles(physics_ms),
+            "fracture_latency_ms": percentiles(list(game.physics.fracture_jobs.latency_ms)),
+            "live_bodies": {"max": int(live_bodies.max()), "final": int(live_bodies[-1])},
+            "live_shards_final": game.physics.shard_pool.get_stats()["live"],
+            "shots_fired": game.gun.projectiles.fired - fired_start,
+            "shots_skipped": skipped_shots,
+            "bottles_restored": restores,
+            "bottles_broken": game.hud.bottles_shot,
+            "fractures_committed": game.physics.fracture_jobs.committed - committed_start,
+            "sections_p99_ms": {name: stats["p99_ms"] for name, stats in sections.items() if stats["count"]},
+        }
+
+    def run(self, names, ticks):
+        results = {}
+        for name in names:
+            print(f"Running {name}...", file=sys.stderr)
+            results[name] = self.run_scenario(name, ticks=ticks, **SCENARIOS[name])
+        return results
+
+
+def make_baseline(results, tolerance=DEFAULT_TOLERANCE):
+    return {
+        "tolerance": dict(tolerance),
+        "scenarios": {name: {metric: get_metric(result, metric) for metric in CHECKED_METRICS}
+                      for name, result in results.items()},
+    }
+
+
+def check_load(results):
+    """Return a message for each scenario that couldn't fire every shot it was meant to."""
+    return [f"{name}: {result['shots_skipped']} of {result['shots_fired'] + result['shots_skipped']} shots skipped"
+            for name, result in results.items() if result["shots_skipped"]]
+
+
+def compare_to_baseline(results, baseline):
+    """Return a list of regression messages (empty when every checked metric is within tolerance)."""
+    tolerance = dict(DEFAULT_TOLERANCE, **baseline.get("tolerance", {}))
+    regressions = []
+    for name, metrics in baseline.get("scenarios", {}).items():
+        if name not in results:
+            continue
+        for metric, expected in metrics.items():
+            value = get_metric(results[name], metric)
+            if metric.startswith("live_bodies"):
+                limit = expected * (1 + tolerance["body_ratio"])
+            elif metric.startswith("fracture_latency"):
+                limit = expected * (1 + tolerance["latency_ratio"]) + tolerance["latency_slack_ms"]
+            else:
+                limit = expected * (1 + tolerance["ratio"]) + tolerance["slack_ms"]
+            if value > limit:
+                regressions.append(f"{name}: {metric} = {value:.3f}, baseline {expected:.3f} (limit {limit:.3f})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless fracture, hit detection and physics benchmarks.")
+    parser.add_argument("scenarios", nargs="*", help=f"scenarios to run (default: all of {', '.join(SCENARIOS)})")
+    parser.add_argument("--ticks", type=int, default=600, help="frames per scenario at 60 fps (default: 600)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE instead of stdout")
+    parser.add_argument("--baseline", default=BASELINE_FILE, help=f"baseline to check against (default: {BASELINE_FILE})")
+    parser.add_argument("--write-baseline", action="store_true", help="save these results as the new baseline")
+    args = parser.parse_args()
+
+    names = args.scenarios or list(SCENARIOS)
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    results = Benchmark(seed=args.seed).run(names, args.ticks)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    incomplete = check_load(results)
+    for message in incomplete:
+        print(f"INCOMPLETE {message}", file=sys.stderr)
+    if incomplete:
+        sys.exit(1)  # Not the load the scenario describes; neither a baseline nor comparable to one
+
+    if args.write_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(make_baseline(results), f, indent=2)
+        print(f"Wrote baseline for {len(results)} scenarios to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f))
+        for message in regressions:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against {args.baseline}", file=sys.stderr)
+    else:
+        print(f"No baseline at {args.baseline}; run with --write-baseline to create one", file=sys.stderr)
@@ -1,64 +1,145 @@
+import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 
+from direct.showbase.DirectObject import DirectObject
 from panda3d.core import AudioManager
-from panda3d.core import AudioSound
-from panda3d.core import NodePath
-from panda3d.core import Filename
-class BGMPlayer:
-    def __init__(self, audio_file):
-        # Correct the line to load the sound
-        self.bgm_sound = base.loader.loadSfx(audio_file)
-
-        # Optionally, play the sound if you want it to start immediately
-        
-
-        if not self.bgm_sound:
-            print(f"Error: Unable to load {audio_file}")
-            return
-        
-        # Set the background music to loop
-        self.bgm_sound.set_loop(True)
-        
-        # Set the volume to a reasonable level (you can adjust this)
-        self.bgm_sound.set_volume(0.5)
-        self.bgm_sound.play()
-        
+
+from game_events import ROUND_WON
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+
+class BGMPlayer(DirectObject):
+    """
+    Background music. Tracks are opened on a worker thread (prefetch() ahead
+    of time, or on demand) and long ones stream from disk instead of being
+    decoded into memory, so switching tracks never loads on the main thread.
+    A switch crossfades the old and new track with an equal-power volume ramp
+    advanced by update(dt) every frame. With a `win_track`, the player
+    switches to it when a ROUND_WON event arrives.
+    """
+
+    def __init__(self, audio_file, win_track=None, volume=0.5, crossfade_time=2.0, stream_threshold=1000000):
+        self.manager = base.musicManager
+        self.volume = volume  # Set the volume to a reasonable level (you can adjust this)
+        self.crossfade_time = crossfade_time  # Seconds
+        self.stream_threshold = stream_threshold  # Tracks at least this many bytes are streamed
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bgm")
+        self.prefetched = {}  # path -> Future of its AudioSound
+        self.pending = None  # Track to switch to as soon as it is open
+        self.fade = None  # [outgoing sound, incoming sound, elapsed seconds] during a crossfade
+        self.bgm_sound = None
+        self.track = None  # Path of the playing track
+        self.win_track = win_track
+
+        # Start the first track as soon as the worker has it open
+        self.replace_bgm(audio_file)
+        if win_track:
+            self.prefetch(win_track)  # Opened in the background now, so the win moment doesn't stall
+            self.accept(ROUND_WON, self.on_round_won)
+
+    def open_track(self, audio_file):
+        """Runs on the worker: open a track, streaming it if it is long."""
+        try:
+            streamed = os.path.getsize(audio_file) >= self.stream_threshold
+            mode = AudioManager.SMStream if streamed else AudioManager.SMSample
+        except OSError:
+            mode = AudioManager.SMHeuristic  # Found on the model path instead; let the manager decide
+        return self.manager.getSound(audio_file, False, mode)
+
+    def prefetch(self, audio_file):
+        """Open a track in the background so a later replace_bgm() can start it at once."""
+        if audio_file not in self.prefetched:
+            self.prefetched[audio_file] = self.executor.submit(self.open_track, audio_file)
+
+    def on_round_won(self):
+        if self.win_track not in (self.track, self.pending):
+            self.replace_bgm(self.win_track)
+
     def play_bgm(self):
         # Play the background music
-        self.bgm_sound.play()
-        print("Background music is now playing.")
-        
+        if self.bgm_sound:
+            self.bgm_sound.play()
+            log.debug("Background music is now playing.")
+
     def stop_bgm(self):
         # Stop the background music
-        self.bgm_sound.stop()
-        print("Background music stopped.")
-        
+        if self.bgm_sound:
+            self.bgm_sound.stop()
+            log.debug("Background music stopped.")
+
     def pause_bgm(self):
         # Pause the background music
-        self.bgm_sound.pause()
-        print("Background music paused.")
-    
+        if self.bgm_sound:
+            self.bgm_sound.pause()
+            log.debug("Background music paused.")
+
     def resume_bgm(self):
         # Resume playing the background music if paused
-        self.bgm_sound.play()
-        print("Background music resumed.")
+        if self.bgm_sound:
+            self.bgm_sound.play()
+            log.debug("Background music resumed.")
+
     def replace_bgm(self, new_audio_file):
-        """Stops the current BGM and starts playing a new one."""
-        print("Replacing current BGM with new one.")
-        
-        # Stop the current background music
-        self.bgm_sound.stop()
-        
-        # Load and play the new background music
-        self.bgm_sound = base.loader.loadSfx(new_audio_file)
-        
-        if not self.bgm_sound:
-            print(f"Error: Unable to load {new_audio_file}")
+        """Crossfade from the current BGM to a new one, once the worker has it open."""
+        log.debug("Replacing current BGM with new one.")
+        self.prefetch(new_audio_file)
+        self.pending = new_audio_file
+        self.start_pending()
+
+    def start_pending(self):
+        future = self.prefetched.get(self.pending)
+        if future is None or not future.done():
             return
-        
+        new_audio_file = self.pending
+        self.pending = None
+        del self.prefetched[new_audio_file]
+        sound = future.result() if future.exception() is None else None
+
+        if not sound:
+            log.error("Unable to load %s", new_audio_file)
+            return
+
         # Set the new background music to loop
-        self.bgm_sound.set_loop(True)
-        
-        # Set the volume to a reasonable level (you can adjust this)
-        self.bgm_sound.set_volume(0.5)
-        self.bgm_sound.play()
-        print(f"New background music ({new_audio_file}) is now playing.")
\ No newline at end of file
+        sound.set_loop(True)
+        if self.fade:
+            # A newer switch interrupts the running crossfade; its outgoing track is dropped
+            self.fade[0].stop()
+            self.fade = None
+        if self.bgm_sound:
+            sound.set_volume(0.0)
+            self.fade = [self.bgm_sound, sound, 0.0]
+        else:
+            sound.set_volume(self.volume)
+        sound.play()
+        self.bgm_sound = sound
+        self.track = new_audio_file
+        log.debug("New background music (%s) is now playing.", new_audio_file)
+
+    def update(self, dt):
+        """Start a track whose load finished and advance the crossfade."""
+        if self.pending:
+            self.start_pending()
+        if self.fade:
+            outgoing, incoming, elapsed = self.fade
+            elapsed += dt
+            t = min(elapsed / self.crossfade_time, 1.0) if self.crossfade_time > 0 else 1.0
+            # Equal power: the summed loudness stays level through the fade
+            outgoing.set_volume(self.volume * math.cos(t * math.pi / 2))
+            incoming.set_volume(self.volume * math.sin(t * math.pi / 2))
+            if t >= 1.0:
+                outgoing.stop()
+                self.fade = None
+            else:
+                self.fade[2] = elapsed
+
+    def cleanup(self):
+        """Stop the music, event handling and the loader thread."""
+        self.ignoreAll()
+        if self.fade:
+            self.fade[0].stop()
+            self.fade = None
+        self.stop_bgm()
+        self.executor.shutdown(wait=False, cancel_futures=True)
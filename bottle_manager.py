@@ -1,13 +1,22 @@
 from panda3d.core import Vec4, BitMask32, LVecBase4f, LVector3, PointLight
 from panda3d.bullet import BulletRigidBodyNode, BulletConvexHullShape
+from direct.showbase.DirectObject import DirectObject
+from direct.showbase.MessengerGlobal import messenger
 from physics import BulletPhysics
-from models import ModelLoader
+from collision_manager import set_collision_group
+from spatial_index import SpatialHash
+from bottle_prefabs import BottlePrefabRegistry
+from light_manager import LightBudget
+from game_events import BOTTLE_BROKEN, ROUND_WON
+from game_log import get_logger
 import os
 import random
 
-class BottleManager:
+log = get_logger(__name__)
+
+class BottleManager(DirectObject):
     def __init__(self, model_loader, render, bullet_world, game, camera, physics, scene_scale=1.0):
-        self.model_loader = ModelLoader(model_loader, render, bullet_world, camera)
+        self.model_loader = model_loader  # The game's ModelLoader, so bottle models come from its cache
         self.render = render
         self.physics = physics
         self.game = game
@@ -17,17 +26,46 @@ class BottleManager:
         
         self.bottle_files = [f for f in os.listdir(self.bottle_path) if f.endswith(".bam")] if os.path.exists(self.bottle_path) else []
         if not self.bottle_files:
-            print("Bottle path does not exist or contains no models!")
+            log.warning("Bottle path does not exist or contains no models!")
+
+        # One loaded model and one simplified collision hull per bottle .bam, shared by every mount
+        self.prefabs = BottlePrefabRegistry(self.model_loader.load_single_model)
+        self.prefabs.preload(os.path.join(self.bottle_path, f) for f in self.bottle_files)
+
+        # Compute (or load from disk) the fracture templates up front, not on the first hit
+        self.physics.fracture_cache.preload(os.path.join(self.bottle_path, f) for f in self.bottle_files)
+        # Likewise turn the bottle textures into shard color palettes once
+        bottle_textures = [f for f in os.listdir(self.bottle_path) if f.endswith("Text.jpg")] if os.path.exists(self.bottle_path) else []
+        self.physics.palette_cache.preload(self.model_loader.loader.loadTexture(os.path.join(self.bottle_path, f)) for f in bottle_textures)
         
         self.colors = [
             (1, 0, 0, 1), (1, 0.5, 0, 1), (1, 1, 0, 1),
             (0, 1, 0, 1), (0, 0, 1, 1), (0.29, 0, 0.51, 1), (0.58, 0, 0.83, 1)
         ]
         self.bottles = []
+        # Grid of live bottle positions for proximity and swept-segment hit queries
+        self.index = SpatialHash(cell_size=8.0 * scene_scale)
+        # Bottle lights, each renderable lit only by its few most relevant ones
+        self.lights = LightBudget(render, max_lights=4, cell_size=32.0 * scene_scale)
+        self.accept(BOTTLE_BROKEN, self.on_bottle_broken)
 
     def add_bottle(self, bottle):
         """Add a new bottle to the manager."""
         self.bottles.append(bottle)
+        self.index.insert(bottle, bottle.node.getPos(self.render))
+
+    def move_bottle(self, bottle, pos):
+        """Move a bottle and keep the index in step."""
+        bottle.node.setPos(self.render, pos)
+        self.index.move(bottle, bottle.node.getPos(self.render))
+
+    def bottles_near(self, pos, radius):
+        """Return the live bottles within `radius` of `pos`, nearest first."""
+        return self.index.query_radius(pos, radius)
+
+    def bottles_along(self, start, end, radius):
+        """Return the live bottles within `radius` of the segment start..end, in travel order."""
+        return self.index.query_segment(start, end, radius)
 
     def get_all_bottles(self):
         """Return a list of all bottle nodes."""
@@ -35,6 +73,7 @@ class BottleManager:
     def remove_bottle(self, bottle):
         if not bottle.destroyed:
             bottle.cleanup()
+        self.index.remove(bottle)
         self.bottles.remove(bottle)
 
         
@@ -47,19 +86,24 @@ class BottleManager:
         bottle_nodes = model.findAllMatches("**/bottle*")
         
         if bottle_nodes.isEmpty() or not self.bottle_files:
-            print(f"No bottle mount nodes found in {model.getName()} or no bottles available!")
+            log.warning("No bottle mount nodes found in %s or no bottles available!", model.getName())
             return
         
         for node in bottle_nodes:
-            bottle_model = self.model_loader.load_single_model(os.path.join(self.bottle_path, random.choice(self.bottle_files)))
-            bottle_model.reparentTo(self.render)
+            model_path = os.path.join(self.bottle_path, random.choice(self.bottle_files))
+            prefab = self.prefabs.get(model_path)
+            # Per-mount node carries the transform and tint; the geometry is an instance of the prefab
+            bottle_model = self.render.attachNewNode("Bottle")
+            prefab.instance_to(bottle_model)
             bottle_model.setPos(node.getPos(self.render))
             bottle_model.setHpr(node.getHpr(self.render))
             bottle_model.setColorScale(*random.choice(self.colors))
             
-            bottle = Bottle(bottle_model, self.bullet_world, self.game, self, self.scene_scale)
+            bottle = Bottle(bottle_model, self.bullet_world, self.game, self, self.scene_scale, model_path, prefab.shape)
             self.add_bottle(bottle)
-            self.illuminate_bottle(bottle_model)
+            bottle.light_np = self.illuminate_bottle(bottle_model)
+            self.lights.add_light(bottle, bottle.light_np)
+            self.lights.add_renderable(bottle_model)
             self.game.hud.update_bottles_total(1)
     
     def illuminate_bottle(self, bottle):
@@ -69,21 +113,28 @@ class BottleManager:
         light.setAttenuation((1.0, 0.05 / self.scene_scale, 0.05 / (self.scene_scale ** 2)))
         light_np = bottle.attachNewNode(light)
         light_np.setPos(LVector3(0, -3 * self.scene_scale, 3 * self.scene_scale))
-        self.render.setLight(light_np)
+        # Not set on render: the LightBudget decides which objects this light reaches
+        return light_np
 
     def place_bottles(self, town_model, furniture_models=None):
         """Place bottles in the given models."""
         self.place_bottles_in_model(town_model)
+        self.lights.add_model(town_model)
         if furniture_models:
             for furniture in furniture_models:
                 self.place_bottles_in_model(furniture)
+                self.lights.add_model(furniture)
+        self.lights.refresh()
                 
     
-    def update(self, task):
-        """Update all bottles in the game."""
-        for bottle in self.bottles:
-            bottle.update(task)
-        return task.cont  # Continue checking for updates
+    def on_bottle_broken(self, bottle):
+        """Drop a broken bottle; sends ROUND_WON once the last one is gone."""
+        if bottle not in self.bottles:
+            return
+        self.bottles.remove(bottle)
+        self.lights.refresh()  # Its light went out with it
+        if not self.bottles:
+            messenger.send(ROUND_WON)
     def get_total_bottles(self):
         """Return the total number of bottles in the game."""
         return len(self.bottles)
@@ -94,14 +145,17 @@ class BottleManager:
         for furniture in self.bottles:
             if furniture:
                 furniture.cleanup()  # Remove the model from the scene graph
-                self.bottles.clear()  # Clear the list of stored objects
-                print("All furniture has been cleared from the scene.")
+        self.bottles.clear()  # Clear the list of stored objects
+        self.index.clear()
+        self.lights.clear()
+        log.debug("All furniture has been cleared from the scene.")
         return len(self.bottles)
 
 
 class Bottle:
-    def __init__(self, model, bullet_world, game, bottle_manager, scene_scale=1.0):
+    def __init__(self, model, bullet_world, game, bottle_manager, scene_scale=1.0, model_path=None, shape=None):
         self.model = model  # The model of the bottle
+        self.model_path = model_path  # Source .bam, used to pick fracture templates
         self.bullet_world = bullet_world
         self.game = game
         self.bottle_manager = bottle_manager
@@ -110,56 +164,52 @@ class Bottle:
         self.is_broken = False
         self.node.setName("Bottle")  # Ensure it's named for collision detection
         self.destroyed = False
+        self.light_np = None  # Set by BottleManager when the bottle is placed
         # Set up the collision detection for the bottle
         self.bottle_rb = BulletRigidBodyNode("Bottle")
-        self.bottle_shape = BulletConvexHullShape()
-        for geom in self.bottle_manager.model_loader.get_geometries(self.node):
-            self.bottle_shape.addGeom(geom)
+        if shape is not None:
+            self.bottle_shape = shape  # Shared prefab hull
+        else:
+            self.bottle_shape = BulletConvexHullShape()
+            for geom in self.bottle_manager.model_loader.get_geometries(self.node):
+                self.bottle_shape.addGeom(geom)
         self.bottle_rb.addShape(self.bottle_shape)
-        self.bottle_rb.setMass(1.0)
+        # Kinematic: the body follows the bottle on its mount instead of falling away from it
+        self.bottle_rb.setKinematic(True)
+        set_collision_group(self.bottle_rb, "bottle")
+        self.bottle_rb.setPythonTag("bottle", self)  # Lets the HitDispatcher map contacts back to us
         self.node.attachNewNode(self.bottle_rb)
         self.bottle_manager.bullet_world.attachRigidBody(self.bottle_rb)
 
-    def update(self, task):
-        if self.destroyed:
-            self.bottle_manager.remove_bottle(self)  # Ensure it's removed from active bottles
-            return task.done  # Stop updating this bottle
-
-        if self.node.isEmpty():
-            print("[ERROR] Bottle node is empty, skipping update")
-            return task.done
-        if not self.node.isEmpty():
-            self.bullet_world.attachRigidBody(self.bottle_rb)
-        else:
-            print("[ERROR] Bottle node is empty, skipping physics attachment")
-
-        # Perform ray test for collision detection
-        start = self.node.getPos(self.game.render)  # Get bottle's world position
-        forward_dir = self.node.getQuat(self.game.render).getUp()  # Pellet's direction
-        end = start + forward_dir * 4  # Move a small distance forward
-
-        result = self.game.bullet_world.rayTestClosest(start, end)
-        
-        if result.hasHit():
-            hit_node = result.getNode()
-            hit_name = hit_node.getName() if hit_node else "Unknown"
-            
-            if hit_name == "Pellet":
-                print(f"[DEBUG] Pellet collision detected with bottle at {hit_node.getPos(self.game.render)}")
-                self.bottle_manager.physics.break_bottle(self.node)  # Call break bottle logic
-                self.is_broken = True  # Mark this bottle as broken
-                self.destroyed = True
-
-        return task.cont  # Keep the update loop going
-
     def cleanup(self):
         """Clean up the bottle by removing it from the scene and physics simulation."""
+        # Switch off the bottle's light everywhere it was shining
+        self.bottle_manager.lights.remove_light(self)
+        self.bottle_manager.lights.remove_renderable(self.node)
+
         # Detach the bottle's node from the scene graph
         self.node.detachNode()
         
         # Remove the bottle's rigid body from the Bullet physics world
         self.bullet_world.removeRigidBody(self.bottle_rb)
+        self.bottle_rb.clearPythonTag("bottle")
+        self.bottle_manager.index.remove(self)
         
         # Optionally delete the bottle object if no longer needed
         del self
+
+    def restore(self, transform, color_scale):
+        """Put the bottle back on its mount as it was at the start of the round."""
+        if self.destroyed:
+            # Undo cleanup(): the node, body, light and shared shape were all kept
+            self.node.reparentTo(self.game.render)
+            self.bottle_rb.setPythonTag("bottle", self)
+            self.bullet_world.attachRigidBody(self.bottle_rb)
+            self.destroyed = False
+        self.node.setTransform(transform)
+        self.node.setColorScale(color_scale)
+        self.bottle_manager.index.insert(self, self.node.getPos(self.game.render))
+        if self.light_np is not None and self not in self.bottle_manager.lights.lights:
+            self.bottle_manager.lights.add_light(self, self.light_np)
+            self.bottle_manager.lights.add_renderable(self.node)
     
\ No newline at end of file
@@ -0,0 +1,115 @@
+import numpy as np
+from scipy.spatial import ConvexHull, QhullError
+from panda3d.core import Geom, GeomVertexReader, LPoint3f
+from panda3d.bullet import BulletConvexHullShape
+
+
+def read_vertices(model):
+    """Return every vertex position of a model as an (N, 3) array in the model's space."""
+    chunks = []
+    for node_path in model.findAllMatches("**/+GeomNode"):
+        mat = node_path.getMat(model)
+        geom_node = node_path.node()
+        for i in range(geom_node.getNumGeoms()):
+            vertex_data = geom_node.getGeom(i).getVertexData()
+            points = vertex_array(vertex_data)
+            if len(points):
+                # Row-vector convention: p' = [p 1] * M
+                rotation = np.array([[mat.getCell(r, c) for c in range(3)] for r in range(3)])
+                translation = np.array([mat.getCell(3, c) for c in range(3)])
+                chunks.append(points @ rotation + translation)
+    return np.vstack(chunks) if chunks else np.zeros((0, 3))
+
+
+def vertex_array(vertex_data):
+    """Read a GeomVertexData's vertex column, straight from the buffer when it is plain float32."""
+    vertex_format = vertex_data.getFormat()
+    column = vertex_format.getColumn("vertex")
+    if column is None:
+        return np.zeros((0, 3))
+    rows = vertex_data.getNumRows()
+    if column.getNumericType() == Geom.NT_float32 and column.getNumComponents() >= 3:
+        array = vertex_data.getArray(vertex_format.getArrayWith("vertex"))
+        stride = array.getArrayFormat().getStride()
+        data = np.frombuffer(array.getHandle().getData(), dtype=np.uint8).reshape(rows, stride)
+        start = column.getStart()
+        return data[:, start:start + 12].copy().view(np.float32).astype(np.float64)
+
+    reader = GeomVertexReader(vertex_data, "vertex")
+    return np.array([tuple(reader.getData3()) for _ in range(rows)])
+
+
+def simplify_hull(points, max_points=64):
+    """
+    Reduce a point cloud to at most `max_points` points on its convex hull,
+    keeping the hull vertices that are farthest apart (farthest point sampling).
+    """
+    if len(points) < 4:
+        return points
+    try:
+        points = points[ConvexHull(points).vertices]
+    except QhullError:
+        pass  # Flat or degenerate: sample from the raw points instead
+    if len(points) <= max_points:
+        return points
+
+    chosen = [int(np.argmax(np.linalg.norm(points - points.mean(axis=0), axis=1)))]
+    distances = np.linalg.norm(points - points[chosen[0]], axis=1)
+    while len(chosen) < max_points:
+        index = int(np.argmax(distances))
+        chosen.append(index)
+        distances = np.minimum(distances, np.linalg.norm(points - points[index], axis=1))
+    return points[chosen]
+
+
+class BottlePrefab:
+    """One bottle model: loaded once, drawn by instancing, with one shared collision hull."""
+
+    def __init__(self, model_path, model, hull_points):
+        self.model_path = model_path
+        self.model = model  # Never parented to the scene itself; mounts hold instances of it
+        self.hull_points = hull_points
+        self.shape = BulletConvexHullShape()
+        for x, y, z in hull_points:
+            self.shape.addPoint(LPoint3f(x, y, z))
+        self.instances = 0
+
+    def instance_to(self, parent):
+        """Show this prefab's geometry under `parent` without copying it."""
+        self.instances += 1
+        return self.model.instanceTo(parent)
+
+
+class BottlePrefabRegistry:
+    """
+    Bottle prefabs keyed by .bam path. Loading and hull generation happen once
+    per distinct model, so cost and memory follow the number of bottle models
+    rather than the number of mounts.
+    """
+
+    def __init__(self, load_model, max_hull_points=64):
+        self.load_model = load_model  # Callable returning a NodePath for a model path
+        self.max_hull_points = max_hull_points
+        self.prefabs = {}
+
+    def preload(self, model_paths):
+        """Build the prefabs for the given models up front."""
+        for model_path in model_paths:
+            self.get(model_path)
+
+    def get(self, model_path):
+        """Return the prefab for a model, loading it on first use."""
+        prefab = self.prefabs.get(model_path)
+        if prefab is None:
+            model = self.load_model(model_path)
+            model.detachNode()
+            hull_points = simplify_hull(read_vertices(model), self.max_hull_points)
+            prefab = self.prefabs[model_path] = BottlePrefab(model_path, model, hull_points)
+        return prefab
+
+    def get_stats(self):
+        return {
+            "prefabs": len(self.prefabs),
+            "instances": sum(prefab.instances for prefab in self.prefabs.values()),
+            "hull_points": {path: len(prefab.hull_points) for path, prefab in self.prefabs.items()},
+        }
@@ -1,13 +1,72 @@
 from panda3d.core import CollisionNode, CollisionBox, CollisionSphere
-from panda3d.bullet import BulletRigidBodyNode, BulletBoxShape, BulletSphereShape
-from panda3d.core import Point3
+from panda3d.bullet import BulletRigidBodyNode, BulletBoxShape, BulletSphereShape, BulletWorld
+from panda3d.core import Point3, Vec3, BitMask32, NodePath, loadPrcFileData
+
+# Collision layers. Every rigid body belongs to exactly one group (one bit of
+# its into-collide mask); the world's group matrix decides which groups touch.
+COLLISION_GROUPS = {
+    "static": 0,  # Town, temple, furniture: never moves
+    "player": 1,
+    "pellet": 2,
+    "bottle": 3,
+    "shard": 4,  # Debris from broken bottles
+}
+
+# Pairs of groups that collide. Anything not listed - a group with itself
+# included - is filtered out in the broadphase.
+COLLISION_PAIRS = [
+    ("static", "player"),
+    ("static", "pellet"),
+    ("static", "bottle"),
+    ("static", "shard"),
+    ("player", "bottle"),
+    ("pellet", "bottle"),
+    ("bottle", "shard"),
+]
+
+
+def collision_mask(group):
+    """Return the into-collide mask for a collision group."""
+    return BitMask32.bit(COLLISION_GROUPS[group])
+
+
+def set_collision_group(node, group):
+    """Put a Bullet body (node or NodePath) into a collision group."""
+    if isinstance(node, NodePath):
+        node = node.node()
+    node.setIntoCollideMask(collision_mask(group))
+
+
+def apply_collision_matrix(bullet_world, debris_collisions=False):
+    """
+    Write the group matrix into a world. Shard-vs-shard contacts are off unless
+    `debris_collisions` is set: a 100-shard break would otherwise add thousands
+    of broadphase pairs.
+    """
+    for group_a in COLLISION_GROUPS.values():
+        for group_b in COLLISION_GROUPS.values():
+            bullet_world.setGroupCollisionFlag(group_a, group_b, False)
+    pairs = COLLISION_PAIRS + ([("shard", "shard")] if debris_collisions else [])
+    for name_a, name_b in pairs:
+        bullet_world.setGroupCollisionFlag(COLLISION_GROUPS[name_a], COLLISION_GROUPS[name_b], True)
+
+
+def create_bullet_world(gravity=Vec3(0, 0, -9.81), debris_collisions=False):
+    """Create a BulletWorld that filters collisions through the group matrix."""
+    # Must be set before the world is constructed; the default filter only compares masks
+    loadPrcFileData("collision_manager", "bullet-filter-algorithm groups-mask")
+    bullet_world = BulletWorld()
+    bullet_world.setGravity(gravity)
+    apply_collision_matrix(bullet_world, debris_collisions)
+    return bullet_world
+
 
 class CollisionManager:
     def __init__(self, bullet_world, render):
         self.bullet_world = bullet_world
         self.render = render
 
-    def add_collision(self, node_path, shape_type, dimensions, mass=0, position=Point3(0, 0, 0)):
+    def add_collision(self, node_path, shape_type, dimensions, mass=0, position=Point3(0, 0, 0), group="static"):
         """
         General method to add collision to any object.
         :param node_path: The model node to attach the collision to.
@@ -15,6 +74,7 @@ class CollisionManager:
         :param dimensions: The dimensions of the shape (e.g., (width, height, depth) for box or radius for sphere).
         :param mass: The mass of the object (default is 0 for immovable objects).
         :param position: The position where the collision should be placed (default is (0, 0, 0)).
+        :param group: The collision group from COLLISION_GROUPS (default is "static").
         """
         # Create Bullet collision shape based on shape_type
         if shape_type == "box":
@@ -28,6 +88,7 @@ class CollisionManager:
         rigid_node = BulletRigidBodyNode("rigid_node")
         rigid_node.addShape(shape)
         rigid_node.setMass(mass)
+        set_collision_group(rigid_node, group)
 
         # Attach the rigid body to the render node
         node_path = self.render.attachNewNode(rigid_node)
@@ -46,4 +107,4 @@ class CollisionManager:
 
     def setup_player_collision(self, player_model, mass=1):
         # Example: Add collision to player
-        return self.add_collision(player_model, "sphere", 1, mass=mass)
+        return self.add_collision(player_model, "sphere", 1, mass=mass, group="player")
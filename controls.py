@@ -1,5 +1,9 @@
 from panda3d.core import Vec3
 from direct.interval.IntervalGlobal import LerpPosInterval
+from collision_manager import set_collision_group
+from game_log import get_logger
+
+log = get_logger(__name__)
 
 
 class Controls:
@@ -33,7 +37,8 @@ class Controls:
         base.accept("mouse3-down", self.aim_down_sights, [True])
         base.accept("mouse3-up", self.aim_down_sights, [False])
         #self.game.accept("mouse1", self.center_mouse)
-        self.game.taskMgr.add(self.mouse_look, "mouse_look")
+        if not self.game.headless:  # An offscreen buffer has no pointer to read
+            self.game.scheduler.add_system("input", "mouse_look", self.mouse_look)
 
         # Set up player physics
         self.setup_player()
@@ -47,6 +52,7 @@ class Controls:
         player_shape = BulletSphereShape(1)
         self.player_node = BulletRigidBodyNode("player")
         self.player_node.addShape(player_shape)
+        set_collision_group(self.player_node, "player")
         self.player_node.setMass(70)
         self.player_node.setAngularFactor(0)
         self.player_node.setKinematic(True)
@@ -84,7 +90,7 @@ class Controls:
         new_pos = self.player_np.getPos() + move_vec
         self.player_np.setPos(new_pos)
 
-    def mouse_look(self, task):
+    def mouse_look(self, dt):
         """Handle mouse look for aiming."""
         md = self.game.win.getPointer(0)
         x, y = md.getX(), md.getY()
@@ -97,7 +103,6 @@ class Controls:
             self.player_np.setH(self.player_np.getH() - dx)
             self.game.camera.setP(self.game.camera.getP() - dy)
             self.game.win.movePointer(0, center_x, center_y)
-        return task.cont
 
     def center_mouse(self):
         """Re-center the mouse on click."""
@@ -106,7 +111,7 @@ class Controls:
         self.game.win.movePointer(0, center_x, center_y)
 
     def aim_down_sights(self, is_aiming):
-        print(f"Aiming down sights: {is_aiming}")
+        log.debug("Aiming down sights: %s", is_aiming)
         
         if is_aiming and not self.gun_aiming:
             # Gun is now aiming, move it to the camera’s front view
@@ -1,22 +1,44 @@
+import argparse
+import hashlib
+import json
 import os
+import shlex
 import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def convert_blend_to_bam(blend_file, output_dir):
-    """Convert a single .blend file to .bam using blend2bam."""
+# {src} and {dst} are replaced with the .blend and .bam paths
+DEFAULT_CONVERTER = "blend2bam --textures copy {src} {dst}"
+MANIFEST_NAME = ".convert_manifest.json"
+
+def file_hash(path):
+    """SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def convert_blend_to_bam(blend_file, output_dir, converter=DEFAULT_CONVERTER):
+    """Convert a single .blend file to .bam with the converter command (blend2bam by default)."""
     # Ensure the output directory exists
     os.makedirs(output_dir, exist_ok=True)
-    
+
     # Construct the output .bam file path
     bam_file = os.path.join(output_dir, os.path.splitext(os.path.basename(blend_file))[0] + '.bam')
-    
-    # Run the blend2bam command with the --textures copy option
-    subprocess.run(['blend2bam', '--textures', 'copy', blend_file, bam_file], check=True)
-    print(f"Converted {blend_file} to {bam_file}")
 
-def process_directory(root_dir):
-    """Process all .blend files in the directory and subdirectories."""
+    # Run the converter, e.g. blend2bam with the --textures copy option
+    command = [part.format(src=blend_file, dst=bam_file) for part in shlex.split(converter)]
+    start = time.perf_counter()
+    subprocess.run(command, check=True, capture_output=True)
+    elapsed = time.perf_counter() - start
+    print(f"Converted {blend_file} to {bam_file} in {elapsed:.2f}s")
+    return bam_file, elapsed
+
+def find_blend_files(root_dir):
+    """Yield (blend path, output directory) for every .blend file under root_dir."""
     for dirpath, dirnames, filenames in os.walk(root_dir):
-        for filename in filenames:
+        for filename in sorted(filenames):
             if filename.lower().endswith('.blend'):
                 blend_file = os.path.join(dirpath, filename)
                 # Calculate the relative path of the blend file
@@ -24,10 +46,95 @@ def process_directory(root_dir):
                 # Replace the .blend extension with .bam
                 bam_rel_path = os.path.splitext(rel_path)[0] + '.bam'
                 # Determine the output directory
-                output_dir = os.path.join(root_dir, os.path.dirname(bam_rel_path))
-                # Convert the blend file to bam
-                convert_blend_to_bam(blend_file, output_dir)
+                yield blend_file, os.path.join(root_dir, os.path.dirname(bam_rel_path))
+
+def load_manifest(root_dir):
+    try:
+        with open(os.path.join(root_dir, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(root_dir, manifest):
+    path = os.path.join(root_dir, MANIFEST_NAME)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def plan_conversions(root_dir, converter=DEFAULT_CONVERTER, force=False):
+    """
+    Split the .blend files under root_dir into ones that need converting and
+    ones whose source hash, converter command and output are unchanged since
+    the last run. Returns (to_convert, up_to_date, hashes).
+    """
+    manifest = load_manifest(root_dir)
+    to_convert, up_to_date, hashes = [], [], {}
+    for blend_file, output_dir in find_blend_files(root_dir):
+        rel_path = os.path.relpath(blend_file, root_dir)
+        hashes[rel_path] = file_hash(blend_file)
+        entry = manifest.get(rel_path, {})
+        bam_file = os.path.join(output_dir, os.path.splitext(os.path.basename(blend_file))[0] + '.bam')
+        if (not force and entry.get('hash') == hashes[rel_path] and entry.get('converter') == converter
+                and os.path.exists(bam_file)):
+            up_to_date.append((blend_file, output_dir))
+        else:
+            to_convert.append((blend_file, output_dir))
+    return to_convert, up_to_date, hashes
+
+def process_directory(root_dir, converter=DEFAULT_CONVERTER, jobs=None, dry_run=False, force=False):
+    """
+    Convert the .blend files in the directory and subdirectories that changed
+    since the last run, several at a time. Returns a report dict with
+    per-file status and timings.
+    """
+    start = time.perf_counter()
+    to_convert, up_to_date, hashes = plan_conversions(root_dir, converter, force)
+    report = {'converted': {}, 'failed': {}, 'skipped': [os.path.relpath(f, root_dir) for f, _ in up_to_date],
+              'pending': [os.path.relpath(f, root_dir) for f, _ in to_convert] if dry_run else []}
+    for rel_path in report['skipped']:
+        print(f"Up to date: {rel_path}")
+    if dry_run:
+        for rel_path in report['pending']:
+            print(f"Would convert: {rel_path}")
+        return report
+
+    manifest = load_manifest(root_dir)
+    # Every file is independent, so each conversion gets its own process
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = {executor.submit(convert_blend_to_bam, blend_file, output_dir, converter): blend_file
+                   for blend_file, output_dir in to_convert}
+        for future in as_completed(futures):
+            rel_path = os.path.relpath(futures[future], root_dir)
+            try:
+                bam_file, elapsed = future.result()
+            except (subprocess.CalledProcessError, OSError) as e:
+                print(f"Failed to convert {rel_path}: {e}")
+                report['failed'][rel_path] = str(e)
+                manifest.pop(rel_path, None)
+                continue
+            report['converted'][rel_path] = round(elapsed, 3)
+            manifest[rel_path] = {'hash': hashes[rel_path], 'converter': converter,
+                                  'output': os.path.relpath(bam_file, root_dir)}
+    # Forget sources that no longer exist
+    manifest = {rel_path: entry for rel_path, entry in manifest.items() if rel_path in hashes}
+    save_manifest(root_dir, manifest)
+    report['total_seconds'] = round(time.perf_counter() - start, 3)
+    return report
 
 if __name__ == "__main__":
-    project_dir = os.getcwd()  # Get the current working directory
-    process_directory(project_dir)
+    parser = argparse.ArgumentParser(description="Convert changed .blend files to .bam.")
+    parser.add_argument("root", nargs="?", default=os.getcwd(), help="Directory to scan (default: current directory)")
+    parser.add_argument("--converter", default=DEFAULT_CONVERTER,
+                        help="Converter command; {src} and {dst} are replaced with the input and output paths")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Parallel conversions (default: CPU count)")
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be converted")
+    parser.add_argument("--force", action="store_true", help="Convert everything, ignoring the manifest")
+    parser.add_argument("--report", metavar="FILE", help="Write the per-file report as JSON")
+    args = parser.parse_args()
+
+    report = process_directory(args.root, args.converter, args.jobs, args.dry_run, args.force)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    print(f"{len(report['converted'])} converted, {len(report['skipped'])} up to date, "
+          f"{len(report['failed'])} failed, {len(report['pending'])} pending")
@@ -0,0 +1,259 @@
+import os
+import random
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from scipy.spatial import ConvexHull, QhullError, Voronoi
+from panda3d.core import Geom, GeomNode, GeomVertexData, GeomVertexFormat, GeomTriangles
+from panda3d.core import GeomVertexWriter, LPoint3f
+from panda3d.bullet import BulletConvexHullShape
+from shard_batch import build_batch_arrays
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+# Bump when the on-disk layout or the fracture algorithm changes
+CACHE_VERSION = 1
+
+
+def compute_fracture(seed, num_points=128, extent=1.0):
+    """
+    Compute one Voronoi fracture pattern inside a cube of half-size `extent`.
+    Returns a dict of flat NumPy arrays:
+      centroids (S, 3), vertices (V, 3) relative to their shard's centroid,
+      vertex_offsets (S + 1), triangles (T, 3) indexing into vertices,
+      triangle_offsets (S + 1).
+    Pure NumPy/SciPy so it can run anywhere (no Panda objects are created).
+    """
+    rng = np.random.default_rng(seed)
+    points = np.vstack(([0, 0, 0], rng.uniform(-extent, extent, (num_points - 1, 3))))
+    vor = Voronoi(points)
+
+    centroids, vertices, triangles = [], [], []
+    vertex_offsets, triangle_offsets = [0], [0]
+    for region_index in vor.point_region:
+        region = vor.regions[region_index]
+        if not region or -1 in region:
+            continue
+
+        # Clamp the cell into the fracture volume and rebuild it as a closed hull
+        cell = np.clip(vor.vertices[region], -extent, extent)
+        try:
+            hull = ConvexHull(cell)
+        except QhullError:
+            continue  # Degenerate (flat) cell after clamping
+
+        hull_points = cell[hull.vertices]
+        centroid = hull_points.mean(axis=0)
+        remap = np.full(len(cell), -1, dtype=np.int32)
+        remap[hull.vertices] = np.arange(len(hull.vertices), dtype=np.int32)
+        tris = remap[hull.simplices]
+
+        # Qhull does not orient its facets; flip any that face inwards
+        a, b, c = (hull_points[tris[:, k]] for k in range(3))
+        facing = np.einsum("ij,ij->i", np.cross(b - a, c - a), hull.equations[:, :3])
+        tris[facing < 0] = tris[facing < 0][:, ::-1]
+
+        centroids.append(centroid)
+        triangles.append(tris + vertex_offsets[-1])
+        vertices.append(hull_points - centroid)
+        vertex_offsets.append(vertex_offsets[-1] + len(hull_points))
+        triangle_offsets.append(triangle_offsets[-1] + len(tris))
+
+    return {
+        "centroids": np.asarray(centroids, dtype=np.float32).reshape(-1, 3),
+        "vertices": np.concatenate(vertices).astype(np.float32) if vertices else np.zeros((0, 3), np.float32),
+        "vertex_offsets": np.asarray(vertex_offsets, dtype=np.int32),
+        "triangles": np.concatenate(triangles).astype(np.int32) if triangles else np.zeros((0, 3), np.int32),
+        "triangle_offsets": np.asarray(triangle_offsets, dtype=np.int32),
+    }
+
+
+class FractureTemplate:
+    """
+    One precomputed fracture pattern. Panda Geoms and Bullet hull shapes are
+    built lazily on first use and then shared by every break that picks it.
+    """
+
+    FIELDS = ("centroids", "vertices", "vertex_offsets", "triangles", "triangle_offsets")
+
+    def __init__(self, centroids, vertices, vertex_offsets, triangles, triangle_offsets):
+        self.centroids = centroids
+        self.vertices = vertices
+        self.vertex_offsets = vertex_offsets
+        self.triangles = triangles
+        self.triangle_offsets = triangle_offsets
+        self._geoms = None
+        self._shapes = None
+        self._batch_arrays = None
+
+    @property
+    def shard_count(self):
+        return len(self.centroids)
+
+    def hull_points(self, index):
+        """Return the hull vertices of one shard, relative to its centroid."""
+        return self.vertices[self.vertex_offsets[index]:self.vertex_offsets[index + 1]]
+
+    def prepare(self):
+        """Build the shared hull shapes and batched arrays ahead of the first break."""
+        self.get_shapes()
+        self.get_batch_arrays()
+
+    def get_geoms(self):
+        """Return one Geom per shard, building them on first use."""
+        if self._geoms is None:
+            self._geoms = []
+            for i in range(self.shard_count):
+                start, end = int(self.vertex_offsets[i]), int(self.vertex_offsets[i + 1])
+                vertex_data = GeomVertexData("shard", GeomVertexFormat.getV3(), Geom.UHStatic)
+                vertex_data.uncleanSetNumRows(end - start)
+                vertex_writer = GeomVertexWriter(vertex_data, "vertex")
+                for x, y, z in self.vertices[start:end]:
+                    vertex_writer.setData3f(x, y, z)
+
+                geom_triangles = GeomTriangles(Geom.UHStatic)
+                for a, b, c in self.triangles[self.triangle_offsets[i]:self.triangle_offsets[i + 1]] - start:
+                    geom_triangles.addVertices(int(a), int(b), int(c))
+
+                geom = Geom(vertex_data)
+                geom.addPrimitive(geom_triangles)
+                self._geoms.append(geom)
+        return self._geoms
+
+    def get_batch_arrays(self):
+        """Return the shared (vertex array, triangles) used by batched shard rendering."""
+        if self._batch_arrays is None:
+            self._batch_arrays = build_batch_arrays(self)
+        return self._batch_arrays
+
+    def get_shapes(self):
+        """Return one convex hull shape per shard, building them on first use."""
+        if self._shapes is None:
+            self._shapes = []
+            for i in range(self.shard_count):
+                shape = BulletConvexHullShape()
+                for x, y, z in self.hull_points(i):
+                    shape.addPoint(LPoint3f(x, y, z))
+                self._shapes.append(shape)
+        return self._shapes
+
+
+class FractureTemplateCache:
+    """
+    LRU cache of precomputed fracture templates, keyed by bottle model path.
+    Each model gets `templates_per_model` patterns, computed on first request
+    (or at load via preload) and stored next to the .bam as `<name>.fracture.npz`.
+    """
+
+    def __init__(self, templates_per_model=4, max_models=8, num_points=128, use_disk_cache=True):
+        self.templates_per_model = templates_per_model
+        self.max_models = max_models
+        self.num_points = num_points
+        self.use_disk_cache = use_disk_cache
+        self.templates = OrderedDict()  # model path -> [FractureTemplate]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def cache_path(self, model_path):
+        """Return the on-disk cache file for a model, or None for unnamed models."""
+        if not model_path:
+            return None
+        return os.path.splitext(model_path)[0] + ".fracture.npz"
+
+    def template_seed(self, model_path, index):
+        """Deterministic seed per (model, template) so disk caches are reproducible."""
+        name = os.path.basename(model_path) if model_path else "default"
+        return (zlib.crc32(name.encode("utf-8")) + index) & 0xFFFFFFFF
+
+    def preload(self, model_paths):
+        """Make sure templates for all given models are resident and prepared."""
+        for model_path in model_paths:
+            for template in self.get_templates(model_path):
+                template.prepare()
+
+    def get_templates(self, model_path):
+        """Return the template list for a model, loading or computing it on a miss."""
+        templates = self.peek(model_path)
+        if templates is None:
+            templates = self.insert(model_path, self.build_templates(model_path))
+        return templates
+
+    def peek(self, model_path):
+        """Return the resident templates for a model, or None without computing anything."""
+        templates = self.templates.get(model_path)
+        if templates is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.templates.move_to_end(model_path)
+        return templates
+
+    def build_templates(self, model_path):
+        """
+        Load a model's templates from disk, or compute and save them. Touches no
+        cache state, so it is safe to call from a worker thread.
+        """
+        templates = self.load_from_disk(model_path)
+        if templates is None:
+            templates = [
+                FractureTemplate(**compute_fracture(self.template_seed(model_path, k), self.num_points))
+                for k in range(self.templates_per_model)
+            ]
+            self.save_to_disk(model_path, templates)
+        return templates
+
+    def insert(self, model_path, templates):
+        """Make templates resident, evicting the least recently used models."""
+        self.templates[model_path] = templates
+        self.templates.move_to_end(model_path)
+        while len(self.templates) > self.max_models:
+            self.templates.popitem(last=False)
+            self.evictions += 1
+        return templates
+
+    def pick(self, model_path):
+        """Pick a random template for a model."""
+        return random.choice(self.get_templates(model_path))
+
+    def load_from_disk(self, model_path):
+        path = self.cache_path(model_path)
+        if not self.use_disk_cache or not path or not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                if tuple(data["params"]) != (CACHE_VERSION, self.num_points, self.templates_per_model):
+                    return None
+                return [
+                    FractureTemplate(**{field: data[f"{k}_{field}"] for field in FractureTemplate.FIELDS})
+                    for k in range(self.templates_per_model)
+                ]
+        except (OSError, KeyError, ValueError) as e:
+            log.warning("Ignoring unreadable fracture cache '%s': %s", path, e)
+            return None
+
+    def save_to_disk(self, model_path, templates):
+        path = self.cache_path(model_path)
+        if not self.use_disk_cache or not path:
+            return
+        arrays = {"params": np.array([CACHE_VERSION, self.num_points, self.templates_per_model])}
+        for k, template in enumerate(templates):
+            for field in FractureTemplate.FIELDS:
+                arrays[f"{k}_{field}"] = getattr(template, field)
+        try:
+            # Write then rename, so a concurrent reader never sees a half-written cache
+            with open(path + ".tmp", "wb") as f:
+                np.savez_compressed(f, **arrays)
+            os.replace(path + ".tmp", path)
+        except OSError as e:
+            log.warning("Could not write fracture cache '%s': %s", path, e)
+
+    def get_stats(self):
+        return {
+            "models": len(self.templates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,146 @@
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from fracture_cache import FractureTemplate, compute_fracture
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+
+def plan_fracture(template, seed, spread=0.1, impulse=10.0):
+    """Per-hit randomness for a template: shard spawn offsets and impulses."""
+    rng = np.random.default_rng(seed)
+    count = template.shard_count
+    return {
+        "offsets": template.centroids + rng.uniform(-spread, spread, (count, 3)),
+        "impulses": rng.uniform(-impulse, impulse, (count, 3)),
+    }
+
+
+class FractureJobs:
+    """
+    Runs fracture work (Voronoi solve, hull generation, per-hit planning) on a
+    worker pool and hands finished results back to the main thread, which
+    commits them into the scene graph and BulletWorld via collect(), within
+    a per-frame time budget. A hit only queues a job, so the render loop
+    never waits on SciPy.
+    """
+
+    def __init__(self, fracture_cache, max_workers=2, commit_budget_ms=8.0, unique_fractures=False):
+        self.fracture_cache = fracture_cache
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="fracture")
+        self.commit_budget_ms = commit_budget_ms  # Main-thread time per frame for spawning finished jobs
+        self.unique_fractures = unique_fractures  # Fresh Voronoi per hit instead of a cached template
+        # When set, collect() takes every finished job each frame, ignoring commit_budget_ms, so
+        # commits don't depend on how fast the frame was. It still never blocks: with resident
+        # templates a hit's job is finished when it is submitted. Game sets it for seeded runs.
+        self.deterministic = False
+        self.pending = deque()  # (future, request) in submission order
+        self.template_futures = {}  # model path -> Future of its template list
+        self.submitted = 0
+        self.committed = 0
+        self.failed = 0
+        self.latency_ms = deque(maxlen=1024)  # Submit-to-commit time of recent fractures
+
+    def submit(self, model_path, position, texture, seed):
+        """Queue a fracture for a bottle broken at `position`."""
+        request = {"model_path": model_path, "position": position, "texture": texture,
+                   "submit_time": time.perf_counter()}
+        if self.unique_fractures:
+            future = self.executor.submit(self.plan_unique, seed)
+        else:
+            templates = self.fracture_cache.peek(model_path)
+            if templates is not None:
+                # Templates are resident: planning is a little NumPy, no need for a thread hop
+                future = Future()
+                future.set_result(self.plan_from_templates(templates, seed))
+            else:
+                future = self.executor.submit(self.plan_from_templates, self.get_template_future(model_path), seed)
+        self.pending.append((future, request))
+        self.submitted += 1
+
+    def get_template_future(self, model_path):
+        """Share one background template build between all hits on a missing model."""
+        future = self.template_futures.get(model_path)
+        if future is None:
+            future = self.executor.submit(self.build_templates, model_path)
+            self.template_futures[model_path] = future
+        return future
+
+    def build_templates(self, model_path):
+        templates = self.fracture_cache.build_templates(model_path)
+        for template in templates:
+            template.prepare()  # Hull shapes and vertex arrays too, so the commit frame stays cheap
+        return templates
+
+    def plan_from_templates(self, templates, seed):
+        if isinstance(templates, Future):
+            templates = templates.result()  # Runs on a worker, so waiting here is fine
+        template = templates[seed % len(templates)]
+        return dict(plan_fracture(template, seed), template=template)
+
+    def plan_unique(self, seed):
+        template = FractureTemplate(**compute_fracture(seed, self.fracture_cache.num_points))
+        template.prepare()
+        return dict(plan_fracture(template, seed), template=template)
+
+    def collect(self):
+        """
+        Yield finished jobs, oldest first, as dicts of request and plan fields.
+        Call from the main thread once per frame and commit each job before
+        taking the next: the first one always comes, further ones only until
+        commit_budget_ms has passed, so a volley is spread over frames by cost
+        rather than by count. Stops at the oldest unfinished job, never waits.
+        """
+        self.adopt_templates()
+        start = time.perf_counter()
+        yielded = 0
+        while self.pending:
+            future, request = self.pending[0]
+            if not future.done():
+                break
+            if yielded and not self.deterministic and (time.perf_counter() - start) * 1000.0 >= self.commit_budget_ms:
+                break
+            self.pending.popleft()
+            try:
+                job = dict(request, **future.result())
+            except Exception as e:
+                log.error("Fracture job failed: %s", e)
+                self.failed += 1
+                continue
+            self.latency_ms.append((time.perf_counter() - request["submit_time"]) * 1000.0)
+            self.committed += 1
+            yielded += 1
+            yield job
+
+    def adopt_templates(self):
+        """Move templates built in the background into the (main-thread) cache."""
+        for model_path, future in list(self.template_futures.items()):
+            if future.done():
+                del self.template_futures[model_path]
+                if future.exception() is None:
+                    self.fracture_cache.insert(model_path, future.result())
+
+    def cancel_pending(self):
+        """Forget fractures not yet committed; their results are never spawned."""
+        for future, _ in self.pending:
+            future.cancel()
+        self.pending.clear()
+
+    def shutdown(self):
+        """Drop queued work and stop the workers."""
+        self.pending.clear()
+        self.template_futures.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        return {
+            "pending": len(self.pending),
+            "submitted": self.submitted,
+            "committed": self.committed,
+            "failed": self.failed,
+            "latency_ms_mean": float(np.mean(self.latency_ms)) if self.latency_ms else 0.0,
+        }
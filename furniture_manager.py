@@ -1,14 +1,29 @@
+import math
 import os
 import random
 from panda3d.core import Vec3
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+
+def count_geoms(node_path):
+    """Number of Geoms under a node: roughly its draw calls when nothing is culled."""
+    geom_nodes = node_path.findAllMatches("**/+GeomNode")
+    return sum(geom_nodes.getPath(i).node().getNumGeoms() for i in range(geom_nodes.getNumPaths()))
+
 
 class FurnitureManager:
-    def __init__(self, loader, render):
-        self.loader = loader
+    def __init__(self, model_loader, render, static_batching=True, batch_cell_size=32.0):
+        self.model_loader = model_loader
         self.render = render
         self.furniture_path = "models/furniture/"
         self.furniture_objects = []  # To store references to placed furniture models
         self.destroyed = False
+        self.static_batching = static_batching  # Merge placed furniture into per-area batches
+        self.batch_cell_size = batch_cell_size
+        self.static_batches = []  # NodePaths holding the flattened furniture geometry
+        self.batch_stats = None
     def place_furniture(self, town_model):
         """
         Find unique furniture mount nodes in the town model and place a random furniture model
@@ -17,7 +32,7 @@ class FurnitureManager:
         # Find all nodes with "furniture" in their name (or similar)
         furniture_nodes = town_model.findAllMatches("**/furniture*")
         if furniture_nodes.isEmpty():
-            print("No furniture nodes found in the town model!")
+            log.warning("No furniture nodes found in the town model!")
             return
 
         # Use a dictionary to collect unique mount positions (rounded to 2 decimals)
@@ -28,19 +43,19 @@ class FurnitureManager:
             if key not in unique_mounts:
                 unique_mounts[key] = node
             else:
-                print(f"Duplicate mount at {key} ignored.")
+                log.debug("Duplicate mount at %s ignored.", key)
 
         # Get available furniture models from the directory
         furniture_files = [f for f in os.listdir(self.furniture_path) if f.endswith(".bam")]
         if not furniture_files:
-            print("No furniture models found in 'models/furniture'!")
+            log.warning("No furniture models found in 'models/furniture'!")
             return
 
         # For each unique mount, place one furniture model
         for key, node in unique_mounts.items():
             random_furniture = random.choice(furniture_files)
             model_path = os.path.join(self.furniture_path, random_furniture)
-            furniture_model = self.loader.loadModel(model_path)
+            furniture_model = self.model_loader.load_single_model(model_path)
             furniture_model.reparentTo(self.render)
             
             # Place furniture using the mount node's world transform
@@ -55,11 +70,65 @@ class FurnitureManager:
                 mount_scale = Vec3(random.uniform(0.8, 1.2))  # Random scale range (adjust as needed)
             furniture_model.setScale(mount_scale)
             
-            print(f"Placed furniture '{random_furniture}' at {node.getPos(self.render)} with scale {furniture_model.getScale()}")
+            log.debug("Placed furniture '%s' at %s with scale %s", random_furniture, node.getPos(self.render), furniture_model.getScale())
             
             # Store the placed furniture model in the list
             self.furniture_objects.append(furniture_model)
 
+        if self.static_batching:
+            self.combine_static()
+
+    def combine_static(self):
+        """
+        Merge the geometry of all placed (never moving) furniture into batches,
+        one per batch_cell_size x batch_cell_size area, and flatten each batch
+        so furniture sharing a render state is drawn together. Only the
+        GeomNodes move, carrying the render state they inherited; each
+        furniture NodePath keeps its transform and every non-geometry node,
+        including mounts that were parented under a mesh, so bottle mount
+        lookups on it still find them.
+        """
+        draw_calls_before = sum(count_geoms(furniture) for furniture in self.furniture_objects)
+
+        cells = {}
+        for furniture in self.furniture_objects:
+            pos = furniture.getPos(self.render)
+            key = (math.floor(pos.x / self.batch_cell_size), math.floor(pos.y / self.batch_cell_size))
+            batch = cells.get(key)
+            if batch is None:
+                batch = cells[key] = self.render.attachNewNode(f"furniture_batch_{key[0]}_{key[1]}")
+            # Mounts and other non-geometry children stay with the furniture, or flattening would remove them
+            for geom_node in furniture.findAllMatches("**/+GeomNode"):
+                for child in geom_node.getChildren():
+                    if not child.node().isGeomNode():
+                        child.wrtReparentTo(furniture)
+            for geom_node in furniture.findAllMatches("**/+GeomNode"):
+                if geom_node.getParent().node().isGeomNode():
+                    continue  # Moves along with its parent GeomNode
+                # Bake in the color, texture etc. inherited from the furniture nodes, which stay behind
+                geom_node.setState(geom_node.getState(self.render))
+                geom_node.wrtReparentTo(batch)  # Keeps its world transform until flattened in
+
+        for batch in cells.values():
+            batch.flattenStrong()
+        self.static_batches.extend(cells.values())
+
+        draw_calls_after = sum(count_geoms(batch) for batch in cells.values())
+        self.batch_stats = {
+            "furniture": len(self.furniture_objects),
+            "batches": len(cells),
+            "draw_calls_before": draw_calls_before,
+            "draw_calls_after": draw_calls_after,
+        }
+        log.debug("Static batching: %d furniture objects in %d batches, draw calls %d -> %d",
+                  len(self.furniture_objects), len(cells), draw_calls_before, draw_calls_after)
+
+    def get_static_batches(self):
+        """
+        Returns the flattened furniture batches (empty without static batching).
+        """
+        return self.static_batches
+
     def get_furniture_objects(self):
         """
         Returns the list of placed furniture objects.
@@ -74,4 +143,7 @@ class FurnitureManager:
             if furniture:
                 furniture.removeNode()  # Remove the model from the scene graph
         self.furniture_objects.clear()  # Clear the list of stored objects
-        print("All furniture has been cleared from the scene.")
+        for batch in self.static_batches:
+            batch.removeNode()
+        self.static_batches.clear()
+        log.debug("All furniture has been cleared from the scene.")
@@ -4,8 +4,11 @@ import os
 import random
 import math
 import colorsys
+import time
 
+import numpy as np
 from panda3d.core import Point3, WindowProperties, AmbientLight, LVecBase4f, LVecBase3f
+from panda3d.core import Camera, ClockObject, loadPrcFileData
 from panda3d.bullet import BulletWorld
 from direct.showbase.ShowBase import ShowBase
 from direct.task import Task
@@ -20,31 +23,73 @@ from sfx import SFX
 from physics import BulletPhysics
 from player import PlayerPhysics
 from hud import HUD
+from collision_manager import create_bullet_world
+from hit_events import HitDispatcher
+from scene_snapshot import SceneSnapshot
+from system_scheduler import SystemScheduler
+from profiler import profiler
+from game_events import ROUND_TIMEOUT
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+
+def seed_random(seed):
+    """Seed every random source the game draws from (random and np.random), for reproducible runs."""
+    random.seed(seed)
+    np.random.seed(seed)
+
 
 class Game(ShowBase):
-    def __init__(self):
+    def __init__(self, headless=False, seed=None, software_render=False):
+        self.headless = headless
+        if headless and software_render:
+            # Draw every frame into an offscreen buffer with the CPU rasterizer, so rendering can be
+            # measured on machines without a GPU or display
+            loadPrcFileData("headless", "load-display p3tinydisplay\nwindow-type offscreen\naudio-library-name null")
+        elif headless:
+            # No window and no audio device, so the game runs on machines without a display
+            loadPrcFileData("headless", "window-type none\naudio-library-name null")
+        if seed is not None:
+            seed_random(seed)
         super().__init__()
 
-        # Set the window to fullscreen at the native resolution
-        self.set_fullscreen()
+        if self.camera is None:
+            # window-type none opens no display region, so no camera is made; the gun and player view still need one
+            self.camera = self.render.attachNewNode("camera")
+            self.cam = self.camera.attachNewNode(Camera("cam"))
 
-        # Lock the mouse in the window
-        props = WindowProperties()
-        props.setCursorHidden(True)
-        self.win.requestProperties(props)
+        if not self.headless:
+            # Set the window to fullscreen at the native resolution
+            self.set_fullscreen()
 
-        # Initialize Bullet physics world
-        self.bullet_world = BulletWorld()
-        self.bullet_world.setGravity(Point3(0, 0, -9.81))
+            # Lock the mouse in the window
+            props = WindowProperties()
+            props.setCursorHidden(True)
+            self.win.requestProperties(props)
+
+        # Initialize Bullet physics world (collisions filtered by the group matrix in collision_manager)
+        self.bullet_world = create_bullet_world()
         self.physics = BulletPhysics(self.bullet_world, self.render)
+        self.hit_dispatcher = HitDispatcher(self.bullet_world)
+        # Seeded runs commit every finished fracture on the frame after the hit, whatever the frame time
+        self.physics.fracture_jobs.deterministic = seed is not None
+
+        # One task runs every per-frame system, phase by phase (input, simulation, hit resolution, presentation)
+        self.scheduler = SystemScheduler(self.taskMgr, profiler=profiler)
 
-        # Load models (town, player, gun)
-        self.model_loader = ModelLoader(self.loader, self.render, self.bullet_world, self.camera, fps_mode=True)
+        # Load models (town, player, gun). With a window they load in the background so it keeps
+        # drawing; headless runs load synchronously so every run starts from the same frame.
+        self.model_loader = ModelLoader(self.loader, self.render, self.bullet_world, self.camera,
+                                        fps_mode=True, load_async=not headless, scheduler=self.scheduler)
+        self.model_loader.when_ready(self.setup_game)
 
+    def setup_game(self):
+        """Build the managers, gun, controls and scene once the preloaded models are resident."""
         # Initialize managers
-        self.furniture_manager = FurnitureManager(self.loader, self.render)
-        self.bottle_manager = BottleManager(self.loader, self.render, self.bullet_world, self, self.camera, self.physics)
-        self.bgm_player = BGMPlayer("bgm.ogg")
+        self.furniture_manager = FurnitureManager(self.model_loader, self.render)
+        self.bottle_manager = BottleManager(self.model_loader, self.render, self.bullet_world, self, self.camera, self.physics)
+        self.bgm_player = BGMPlayer("bgm.ogg", win_track="win.ogg")
         self.sfx = SFX(self)
         self.hud = HUD(self, self.bottle_manager)
         self.player_physics = PlayerPhysics(self.model_loader.player, self.bullet_world)
@@ -56,8 +101,11 @@ class Game(ShowBase):
         self.controls = Controls(self, self.gun, self.model_loader.player)
         self.controls.setup_controls()
 
-        # Set up update task
-        self.taskMgr.add(self.update, "update")
+        # Register the per-frame systems; the gun, HUD and controls registered their own above
+        self.scheduler.add_system("input", "player_movement", self.controls.update)
+        self.scheduler.add_system("simulation", "physics", self.physics.step)
+        # Pellet sweeps run first (registered by the gun), then contact hits
+        self.scheduler.add_system("hit_resolution", "contact_hits", lambda dt: self.hit_dispatcher.dispatch())
 
         # Set up scene (furniture and bottles)
         self.setup_scene()
@@ -66,16 +114,12 @@ class Game(ShowBase):
 
         # Set up ambient lighting (slow ROYGBIV cycling)
         self.setup_lighting()
-        self.bgm_played = False
-        base.taskMgr.add(self.some_task, "someTask")
+        self.scheduler.add_system("presentation", "bgm", self.bgm_player.update)
+        # The win music and bottle/ammo counts react to game_events; only the timeout is handled here
+        self.accept(ROUND_TIMEOUT, self.reset_scene)
 
-    def some_task(self, task):
-        if self.hud.bottles_shot >= self.hud.bottles_total:
-            if not self.bgm_played:  # Check if the win music has been played already
-                # Change the BGM to "win.ogg"
-                self.bgm_player.replace_bgm("win.ogg")
-                self.bgm_played = True  # Set the flag to True so it doesn't play again
-        return task.cont    
+        # Everything a round reset has to put back, captured once the scene is complete
+        self.snapshot = SceneSnapshot(self)
 
     def set_fullscreen(self):
         # Use the pipe's display information to detect the native resolution.
@@ -87,12 +131,12 @@ class Game(ShowBase):
             native_mode = max(modes, key=lambda m: (m.width, m.height))
             width = native_mode.width
             height = native_mode.height
-            print(f"Native resolution detected: {width}x{height}")
+            log.debug("Native resolution detected: %dx%d", width, height)
         else:
             # Fallback to current window properties if no display modes are found.
             props = self.win.getProperties()
             width, height = props.getXSize(), props.getYSize()
-            print(f"Fallback resolution: {width}x{height}")
+            log.debug("Fallback resolution: %dx%d", width, height)
 
         wp = WindowProperties()
         wp.setFullscreen(True)
@@ -110,40 +154,20 @@ class Game(ShowBase):
         # Place bottles on the town model and on each furniture model
         self.bottle_manager.place_bottles(self.model_loader.town, furniture_objects)
 
-    def reset_scene(self):
-        """Reset the scene by clearing and reloading all dynamic objects."""
-        # Remove existing objects
-        self.furniture_manager.clear_furniture()
-        self.bottle_manager.clear_bottles()
-
-        # Reset physics world
-        self.bullet_world = BulletWorld()
-        self.bullet_world.setGravity(Point3(0, 0, -9.81))
-        self.physics = BulletPhysics(self.bullet_world, self.render)
-
-        # Reload models
-        self.model_loader.reload_models()
+        # Batched furniture geometry no longer lives under the furniture objects; light it per batch
+        for batch in self.furniture_manager.get_static_batches():
+            self.bottle_manager.lights.add_model(batch)
+        self.bottle_manager.lights.refresh()
 
-        # Reset managers
-        self.furniture_manager = FurnitureManager(self.loader, self.render)
-        self.bottle_manager = BottleManager(self.loader, self.render, self.bullet_world, self, self.camera, self.physics)
+    def reset_scene(self):
+        """Start a new round by restoring the snapshot taken after setup, in place."""
+        # Debris, queued fractures, pellets in flight and undelivered hits belong to the old round
+        self.physics.reset()
+        self.gun.reset()
+        self.hit_dispatcher.clear()
 
-        # Reinitialize player physics
-        self.player_physics = PlayerPhysics(self.model_loader.player, self.bullet_world)
-        
-        # Reset HUD
-        self.hud.reset()
-        
-        # Reinitialize the gun
-        self.gun = Gun(self, self.bullet_world, self.bottle_manager, self.physics, self.hud)
-        
-        # Reset controls
-        self.controls = Controls(self, self.gun, self.model_loader.player)
-        self.controls.setup_controls()
-        
-        # Reload scene
-        self.setup_scene()
-        print("Scene reset successfully!")
+        elapsed_ms = self.snapshot.restore()
+        log.debug("Scene reset successfully in %.1f ms!", elapsed_ms)
 
     def setup_lighting(self):
         """Set up a slow cycling ambient light."""
@@ -163,14 +187,47 @@ class Game(ShowBase):
         self.ambient_light.setColor(LVecBase4f(r, g, b, 0.1))
         return task.cont
 
-    def update(self, task):
-        """Update the game state, physics, and controls."""
-        dt = globalClock.get_dt()
-        self.bullet_world.doPhysics(dt)
-        # Update all bottles
-        self.bottle_manager.update(task)
-        self.controls.update(dt)
-        return task.cont
+    def run_headless(self, ticks, frame_rate=60):
+        """
+        Run the normal task loop for a fixed number of ticks on a fixed-rate clock
+        (every frame sees dt = 1 / frame_rate) and return timing statistics.
+        """
+        clock = ClockObject.getGlobalClock()
+        clock.setMode(ClockObject.MNonRealTime)
+        clock.setFrameRate(frame_rate)
+
+        frame_ms = np.zeros(ticks)
+        physics_ms = np.zeros(ticks)
+        substeps = 0
+        for i in range(ticks):
+            start = time.perf_counter()
+            self.taskMgr.step()
+            frame_ms[i] = (time.perf_counter() - start) * 1000.0
+            physics_ms[i] = self.physics.stepper.last_step_ms
+            substeps += self.physics.stepper.last_substeps
+
+        return {
+            "ticks": ticks,
+            "frame_rate": frame_rate,
+            "frame_ms": {
+                "mean": float(frame_ms.mean()),
+                "p50": float(np.percentile(frame_ms, 50)),
+                "p99": float(np.percentile(frame_ms, 99)),
+                "max": float(frame_ms.max()),
+            },
+            "physics_ms_mean": float(physics_ms.mean()),
+            "substeps": substeps,
+            "bottles_total": self.hud.bottles_total,
+            "bottles_shot": self.hud.bottles_shot,
+            "rigid_bodies": self.bullet_world.getNumRigidBodies(),
+            "shards": self.physics.shard_pool.get_stats(),
+            "fractures": self.physics.fracture_jobs.get_stats(),
+            "hits": self.hit_dispatcher.get_stats(),
+            "projectiles": self.gun.projectiles.get_stats(),
+            "audio": self.sfx.get_stats(),
+            "phases": self.scheduler.get_stats(),
+            "profile": profiler.get_stats(),
+        }
 
 if __name__ == "__main__":
     game = Game()
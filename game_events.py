@@ -0,0 +1,7 @@
+# Game-state events, sent through Panda's messenger and received with DirectObject.accept().
+# Subscribers only run when the state actually changes, instead of polling it every frame.
+
+BOTTLE_BROKEN = "bottle_broken"  # [bottle]: sent by Gun after a bottle was broken
+AMMO_CHANGED = "ammo_changed"  # [ammo]: sent by Gun whenever its ammo count changes
+ROUND_WON = "round_won"  # []: sent by BottleManager when the last live bottle is broken
+ROUND_TIMEOUT = "round_timeout"  # []: sent by HUD when the round timer runs out
@@ -0,0 +1,35 @@
+import logging
+import os
+import sys
+
+# Environment variable holding the starting level, e.g. SHOOTINGSTAR_LOG=debug
+LOG_LEVEL_ENV = "SHOOTINGSTAR_LOG"
+
+# Every game logger is a child of this one and prints bare messages to stdout, like the prints it replaces
+logger = logging.getLogger("shootingstar")
+logger.propagate = False
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(message)s"))
+logger.addHandler(_handler)
+
+
+def get_logger(name):
+    """
+    Return the logger for one module. Pass message arguments separately
+    (log.debug("hit at %s", point)) so a disabled level costs one cached
+    level check and never formats the message.
+    """
+    return logger.getChild(name)
+
+
+def set_level(level):
+    """Set the level for every game logger, by name ("debug", "info", ...) or number."""
+    if isinstance(level, str):
+        name = level.upper()
+        level = logging.getLevelName(name)
+        if not isinstance(level, int):
+            raise ValueError(f"Unknown log level '{name}'")
+    logger.setLevel(level)
+
+
+set_level(os.environ.get(LOG_LEVEL_ENV, "info"))
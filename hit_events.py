@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+from panda3d.core import PythonCallbackObject
+
+from profiler import profiled
+
+# One pellet hitting one bottle: the pellet's NodePath, the Bottle and the contact point in world space
+HitEvent = namedtuple("HitEvent", ["pellet", "bottle", "point"])
+
+
+class HitDispatcher:
+    """
+    Turns Bullet contact results into pellet-vs-bottle hit events. After every
+    simulation tick the world's contact manifolds are scanned for pairs of a
+    body tagged "pellet" and a body tagged "bottle"; dispatch() then hands each
+    (pellet, bottle) hit to the listeners once. The cost follows the number of
+    contacts, not bottles x pellets.
+    """
+
+    def __init__(self, bullet_world):
+        self.bullet_world = bullet_world
+        self.listeners = []
+        self.pending = {}  # (pellet node, bottle) -> HitEvent, first contact wins
+        self.events_dispatched = 0
+        self.manifolds_scanned = 0
+        self.bullet_world.setTickCallback(PythonCallbackObject(self.on_tick), False)
+
+    def add_listener(self, listener):
+        """Register a callable taking a HitEvent."""
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def on_tick(self, callback_data):
+        """Collect hits from the contacts of the tick Bullet just simulated."""
+        for manifold in self.bullet_world.getManifolds():
+            self.manifolds_scanned += 1
+            if manifold.getNumManifoldPoints() == 0:
+                continue
+            node0, node1 = manifold.getNode0(), manifold.getNode1()
+            if node0.hasPythonTag("pellet") and node1.hasPythonTag("bottle"):
+                pellet, bottle = node0.getPythonTag("pellet"), node1.getPythonTag("bottle")
+                point = manifold.getManifoldPoint(0).getPositionWorldOnB()
+            elif node1.hasPythonTag("pellet") and node0.hasPythonTag("bottle"):
+                pellet, bottle = node1.getPythonTag("pellet"), node0.getPythonTag("bottle")
+                point = manifold.getManifoldPoint(0).getPositionWorldOnA()
+            else:
+                continue
+            key = (pellet.node(), bottle)
+            if key not in self.pending:
+                self.pending[key] = HitEvent(pellet, bottle, point)
+
+    @profiled("hit_dispatch")
+    def dispatch(self):
+        """Deliver the hits gathered since the last call. Run once per frame, after stepping."""
+        if not self.pending:
+            return
+        events = list(self.pending.values())
+        self.pending.clear()
+        for event in events:
+            if event.bottle.destroyed:
+                continue  # Another pellet got there first this frame
+            for listener in self.listeners:
+                listener(event)
+            self.events_dispatched += 1
+
+    def clear(self):
+        """Drop hits collected but not yet dispatched."""
+        self.pending.clear()
+
+    def get_stats(self):
+        return {
+            "events_dispatched": self.events_dispatched,
+            "manifolds_scanned": self.manifolds_scanned,
+        }
@@ -0,0 +1,172 @@
+import math
+
+from spatial_index import SpatialHash
+
+
+def light_range(attenuation, cutoff=0.02):
+    """
+    Distance at which a point light with (constant, linear, quadratic)
+    attenuation falls to `cutoff` of its full intensity.
+    """
+    constant, linear, quadratic = attenuation
+    target = 1.0 / cutoff - constant
+    if quadratic > 0:
+        return (-linear + math.sqrt(linear * linear + 4 * quadratic * target)) / (2 * quadratic)
+    if linear > 0:
+        return target / linear
+    return math.inf
+
+
+class LitObject:
+    """A renderable under the light budget and the lights currently set on it."""
+
+    __slots__ = ("node_path", "center", "radius", "lights")
+
+    def __init__(self, node_path, center, radius):
+        self.node_path = node_path
+        self.center = center
+        self.radius = radius
+        self.lights = set()
+
+
+class LightBudget:
+    """
+    Keeps the bottle PointLights in a spatial hash and gives every registered
+    renderable only its `max_lights` most relevant ones (brightest at the
+    renderable's bounds center), instead of putting every light on render and
+    shading all geometry with all of them. Lights and renderables are assumed
+    static; adding or removing a light only re-picks the renderables in its range.
+    """
+
+    def __init__(self, render, max_lights=4, cell_size=32.0, cutoff=0.02, max_range=200.0):
+        self.render = render
+        self.max_lights = max_lights
+        self.cutoff = cutoff  # Intensity fraction below which a light no longer counts
+        self.range_cap = max_range  # Unattenuated lights would otherwise reach everything
+        self.lights = {}  # owner -> (light NodePath, range)
+        self.light_index = SpatialHash(cell_size)
+        self.max_range = 0.0
+        self.objects = {}  # PandaNode -> LitObject
+        self.object_index = SpatialHash(cell_size)
+        self.max_radius = 0.0
+        self.dirty = set()  # PandaNodes whose lights must be re-picked
+
+    def add_light(self, owner, light_np):
+        """Register `owner`'s PointLight; renderables in range pick it up on the next refresh()."""
+        reach = min(light_range(light_np.node().getAttenuation(), self.cutoff), self.range_cap)
+        self.lights[owner] = (light_np, reach)
+        self.max_range = max(self.max_range, reach)
+        pos = light_np.getPos(self.render)
+        self.light_index.insert(owner, pos)
+        self.mark_near(pos, reach)
+
+    def remove_light(self, owner):
+        """Switch off `owner`'s light: clear it from every renderable it was lighting."""
+        entry = self.lights.pop(owner, None)
+        if entry is None:
+            return
+        light_np, reach = entry
+        pos = self.light_index.get_pos(owner)
+        self.light_index.remove(owner)
+        for node in self.object_index.query_radius(pos, reach + self.max_radius):
+            lit = self.objects[node]
+            if light_np in lit.lights:
+                lit.lights.discard(light_np)
+                if not lit.node_path.isEmpty():
+                    lit.node_path.clearLight(light_np)
+        self.mark_near(pos, reach)  # The next brightest light may now make the cut
+
+    def add_renderable(self, node_path):
+        """Have `node_path` (and what's under it) lit by its most relevant lights."""
+        node = node_path.node()
+        if node in self.objects:
+            return
+        center, radius = self.bounds_of(node_path)
+        self.objects[node] = LitObject(node_path, center, radius)
+        self.object_index.insert(node, center)
+        self.max_radius = max(self.max_radius, radius)
+        self.dirty.add(node)
+
+    def add_model(self, model):
+        """Register each GeomNode of a model separately, so a large model isn't lit from one point."""
+        for node_path in model.findAllMatches("**/+GeomNode"):
+            self.add_renderable(node_path)
+
+    def remove_renderable(self, node_path):
+        node = node_path.node()
+        lit = self.objects.pop(node, None)
+        if lit is None:
+            return
+        self.object_index.remove(node)
+        self.dirty.discard(node)
+        for light_np in lit.lights:
+            node_path.clearLight(light_np)
+
+    def bounds_of(self, node_path):
+        """Return a renderable's bounding sphere (center in render space, radius)."""
+        bounds = node_path.getBounds()
+        if bounds.isEmpty() or bounds.isInfinite():
+            return node_path.getPos(self.render), 0.0
+        return self.render.getRelativePoint(node_path, bounds.getCenter()), bounds.getRadius()
+
+    def mark_near(self, pos, reach):
+        """Flag the renderables a light at `pos` with range `reach` could affect."""
+        for node in self.object_index.query_radius(pos, reach + self.max_radius):
+            lit = self.objects[node]
+            if (lit.center - pos).length() <= reach + lit.radius:
+                self.dirty.add(node)
+
+    def pick_lights(self, lit):
+        """Return the up to max_lights lights contributing most at a renderable."""
+        scored = []
+        for owner in self.light_index.query_radius(lit.center, self.max_range + lit.radius):
+            light_np, reach = self.lights[owner]
+            distance = max((self.light_index.get_pos(owner) - lit.center).length() - lit.radius, 0.0)
+            if distance > reach:
+                continue
+            light = light_np.node()
+            constant, linear, quadratic = light.getAttenuation()
+            color = light.getColor()
+            strength = (color[0] + color[1] + color[2]) / (constant + linear * distance + quadratic * distance * distance)
+            scored.append((strength, light_np))
+        scored.sort(key=lambda entry: -entry[0])
+        return {light_np for _, light_np in scored[:self.max_lights]}
+
+    def refresh(self):
+        """Re-pick lights for renderables flagged since the last call. Cheap when nothing changed."""
+        if not self.dirty:
+            return
+        for node in self.dirty:
+            lit = self.objects[node]
+            if lit.node_path.isEmpty():
+                continue
+            wanted = self.pick_lights(lit)
+            for light_np in lit.lights - wanted:
+                lit.node_path.clearLight(light_np)
+            for light_np in wanted - lit.lights:
+                lit.node_path.setLight(light_np)
+            lit.lights = wanted
+        self.dirty.clear()
+
+    def clear(self):
+        """Forget every light and renderable, clearing the lights that were set."""
+        for lit in self.objects.values():
+            if not lit.node_path.isEmpty():
+                for light_np in lit.lights:
+                    lit.node_path.clearLight(light_np)
+        self.objects.clear()
+        self.object_index.clear()
+        self.lights.clear()
+        self.light_index.clear()
+        self.dirty.clear()
+        self.max_range = self.max_radius = 0.0
+
+    def get_stats(self):
+        lit = [lit for lit in self.objects.values() if lit.lights]
+        return {
+            "active_lights": len(self.lights),
+            "renderables": len(self.objects),
+            "lit_objects": len(lit),
+            "light_assignments": sum(len(entry.lights) for entry in lit),
+            "max_lights_per_object": self.max_lights,
+        }
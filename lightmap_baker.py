@@ -0,0 +1,375 @@
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+
+import numpy as np
+from panda3d.core import Filename, Geom, GeomNode, GeomTriangles, GeomVertexArrayData, GeomVertexArrayFormat
+from panda3d.core import GeomVertexData, GeomVertexFormat, InternalName, Loader, LoaderOptions, NodePath
+from panda3d.core import Texture, TextureAttrib, TextureStage
+
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+# Bump when the baking math or the output layout changes; every geom is rebaked
+BAKE_VERSION = 1
+LIGHTMAP_NAME = "lightmap"  # Texcoord set and TextureStage name
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_stat(path):
+    """Size and modification time: a cheap check for whether a file changed since it was hashed."""
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_lights(paths):
+    """Read Blender-exported spot light lists (name, location, direction, color, intensity, spot_size, spot_blend)."""
+    lights = []
+    for path in paths:
+        with open(path) as f:
+            for entry in json.load(f):
+                lights.append(dict(entry, source=os.path.basename(path)))
+    return lights
+
+
+def light_key(light):
+    return hashlib.sha1(json.dumps(light, sort_keys=True).encode()).hexdigest()
+
+
+def find_baked_model(model_path, output_dir=None):
+    """
+    Return the baked (pre-lit) copy of `model_path` if the lightmap manifest
+    says it was baked from the current file, else None. Used at load time, so
+    the file is only hashed when its size or mtime differ from the bake's.
+    """
+    output_dir = output_dir or os.path.join(os.path.dirname(model_path), "lightmaps")
+    manifest_path = os.path.join(output_dir, "manifest.json")
+    if not os.path.exists(model_path):
+        return None
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    baked = os.path.join(output_dir, manifest.get("output", ""))
+    if manifest.get("version") != BAKE_VERSION or not os.path.exists(baked):
+        return None
+    if manifest.get("source_stat") == file_stat(model_path):
+        return baked  # Untouched since the bake, no need to read the whole file
+    if manifest.get("source_hash") != file_hash(model_path):
+        log.warning("Lightmaps in %s are stale for %s; run lightmap_baker.py", output_dir, model_path)
+        return None
+    return baked
+
+
+def read_column(vertex_data, name):
+    """Return a float column (vertex, normal...) of a GeomVertexData as an (N, C) array."""
+    vertex_format = vertex_data.getFormat()
+    column = vertex_format.getColumn(name)
+    if column is None or column.getNumericType() != Geom.NT_float32:
+        return None
+    rows = vertex_data.getNumRows()
+    array = vertex_data.getArray(vertex_format.getArrayWith(name))
+    stride = array.getArrayFormat().getStride()
+    data = np.frombuffer(array.getHandle().getData(), dtype=np.uint8).reshape(rows, stride)
+    start, width = column.getStart(), column.getNumComponents()
+    return data[:, start:start + 4 * width].copy().view(np.float32).astype(np.float64)
+
+
+def read_triangles(geom):
+    """Return the (T, 3) vertex indices of a Geom's triangles (strips and fans are decomposed)."""
+    index_arrays = []
+    for i in range(geom.getNumPrimitives()):
+        primitive = geom.getPrimitive(i).decompose()
+        if not isinstance(primitive, GeomTriangles):
+            continue
+        if primitive.isIndexed():
+            kind = {Geom.NT_uint8: np.uint8, Geom.NT_uint16: np.uint16, Geom.NT_uint32: np.uint32}[primitive.getIndexType()]
+            indices = np.frombuffer(primitive.getVertices().getHandle().getData(), dtype=kind).astype(np.int64)
+        else:
+            first = primitive.getFirstVertex()
+            indices = np.arange(first, first + primitive.getNumVertices())
+        index_arrays.append(indices.reshape(-1, 3))
+    return np.vstack(index_arrays) if index_arrays else np.zeros((0, 3), dtype=np.int64)
+
+
+def chart_weights(cell):
+    """
+    Barycentric weights of every texel center in a `cell` x `cell` chart. Each
+    triangle is mapped to the lower-left half of its own cell with a one-texel
+    border; texels outside the triangle are clamped onto it, which dilates the
+    edges so bilinear filtering doesn't bleed in neighbouring charts.
+    """
+    centers = np.arange(cell) + 0.5
+    u, v = np.meshgrid((centers - 1) / (cell - 2), (centers - 1) / (cell - 2))
+    u, v = np.clip(u.ravel(), 0, 1), np.clip(v.ravel(), 0, 1)
+    over = u + v > 1
+    total = u[over] + v[over]
+    u[over], v[over] = u[over] / total, v[over] / total
+    return np.stack([1 - u - v, u, v], axis=1)
+
+
+def smoothstep(x):
+    x = np.clip(x, 0.0, 1.0)
+    return x * x * (3 - 2 * x)
+
+
+class LightmapBaker:
+    """
+    CPU lightmap baking for static models lit by Blender spot lights. Every
+    triangle of a Geom gets its own small square chart in that Geom's lightmap
+    texture; the baked light is direct spot lighting (cone with Blender-style
+    blend, inverse-square falloff, Lambert) on top of a flat ambient level, with
+    no shadowing. The lit model is written as a new .bam with a "lightmap"
+    texcoord set and a modulating texture stage, and a manifest of per-Geom
+    keys lets later bakes redo only the Geoms whose mesh or nearby lights changed.
+    """
+
+    def __init__(self, model_path, light_paths, output_dir=None, cell=8, ambient=1.0,
+                 exposure=50.0, cutoff=0.01, overbright=2.0):
+        self.model_path = model_path
+        self.light_paths = light_paths
+        self.output_dir = output_dir or os.path.join(os.path.dirname(model_path), "lightmaps")
+        self.manifest_path = os.path.join(self.output_dir, "manifest.json")
+        self.cell = cell  # Chart size in texels per triangle
+        self.ambient = ambient  # Light level everywhere, so unlit areas keep their current look
+        self.exposure = exposure  # Scales Blender light intensities to lightmap units
+        self.cutoff = cutoff  # Contributions below this are outside a light's range
+        self.overbright = overbright  # Texture stores light / overbright, the stage scales it back
+        self.lights = load_lights(light_paths)
+        self.weights = chart_weights(cell)
+        self.baked = 0
+        self.reused = 0
+
+    def settings(self):
+        return {"cell": self.cell, "ambient": self.ambient, "exposure": self.exposure,
+                "cutoff": self.cutoff, "overbright": self.overbright}
+
+    def load_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return manifest if manifest.get("version") == BAKE_VERSION else {}
+
+    def light_range(self, light):
+        return math.sqrt(max(light["intensity"] * self.exposure * max(light["color"]), 0.0) / self.cutoff)
+
+    def lights_reaching(self, center, radius):
+        """Return the lights whose cone and range can touch a bounding sphere."""
+        reaching = []
+        for light in self.lights:
+            to_center = center - np.array(light["location"])
+            distance = np.linalg.norm(to_center)
+            if distance - radius > self.light_range(light):
+                continue
+            if distance > radius:
+                direction = np.array(light["direction"]) / np.linalg.norm(light["direction"])
+                angle = math.acos(np.clip(np.dot(to_center / distance, direction), -1.0, 1.0))
+                if angle - math.asin(min(radius / distance, 1.0)) > light["spot_size"] / 2:
+                    continue
+            reaching.append(light)
+        return reaching
+
+    def bake(self, force=False):
+        """Bake every Geom of the model, reusing unchanged lightmaps. Returns the baked model path."""
+        start = time.perf_counter()
+        os.makedirs(self.output_dir, exist_ok=True)
+        previous = {} if force else self.load_manifest().get("geoms", {})
+        if previous and self.load_manifest().get("settings") != self.settings():
+            previous = {}  # Different settings change every texel
+
+        loader = Loader.getGlobalPtr()
+        model = loader.loadSync(Filename.fromOsSpecific(self.model_path), LoaderOptions(LoaderOptions.LF_no_cache))
+        if model is None:
+            raise IOError(f"Could not load {self.model_path}")
+        root = NodePath(model)
+        base_name = os.path.splitext(os.path.basename(self.model_path))[0]
+
+        geoms = {}
+        for node_index, node_path in enumerate(root.findAllMatches("**/+GeomNode")):
+            geom_node = node_path.node()
+            mat = node_path.getMat(root)
+            for geom_index in range(geom_node.getNumGeoms()):
+                key = f"{node_index}:{node_path.getName()}:{geom_index}"
+                geom = geom_node.getGeom(geom_index)
+                entry = self.bake_geom(geom_node, geom_index, geom, mat, key, previous.get(key), base_name)
+                if entry is not None:
+                    geoms[key] = entry
+
+        output = f"{base_name}.lit.bam"
+        root.writeBamFile(Filename.fromOsSpecific(os.path.join(self.output_dir, output)))
+        manifest = {
+            "version": BAKE_VERSION,
+            "source": os.path.relpath(self.model_path, self.output_dir),
+            "source_hash": file_hash(self.model_path),
+            "source_stat": file_stat(self.model_path),
+            "lights": {path: file_hash(path) for path in self.light_paths},
+            "settings": self.settings(),
+            "output": output,
+            "geoms": geoms,
+        }
+        with open(self.manifest_path + ".tmp", "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+        log.info("Baked %d lightmaps, reused %d, in %.1fs -> %s",
+                 self.baked, self.reused, time.perf_counter() - start, os.path.join(self.output_dir, output))
+        return os.path.join(self.output_dir, output)
+
+    def bake_geom(self, geom_node, geom_index, geom, mat, key, previous, base_name):
+        """Unweld one Geom into per-triangle charts, bake (or reuse) its lightmap and attach it."""
+        vertex_data = geom.getVertexData()
+        positions = read_column(vertex_data, "vertex")
+        triangles = read_triangles(geom)
+        if positions is None or len(triangles) == 0:
+            return None
+
+        # Row-vector convention: p' = [p 1] * M
+        rotation = np.array([[mat.getCell(r, c) for c in range(3)] for r in range(3)])
+        translation = np.array([mat.getCell(3, c) for c in range(3)])
+        corners = (positions @ rotation + translation)[triangles]  # (T, 3, 3) in model space
+        center = corners.reshape(-1, 3).mean(axis=0)
+        radius = float(np.linalg.norm(corners.reshape(-1, 3) - center, axis=1).max())
+        lights = self.lights_reaching(center, radius)
+
+        digest = hashlib.sha1()
+        digest.update(positions.tobytes())
+        digest.update(triangles.tobytes())
+        digest.update(np.array(mat, dtype=np.float64).tobytes())
+        for light in lights:
+            digest.update(light_key(light).encode())
+        geom_key = digest.hexdigest()
+
+        columns = int(math.ceil(math.sqrt(len(triangles))))
+        rows = int(math.ceil(len(triangles) / columns))
+        width, height = columns * self.cell, rows * self.cell
+        texture_file = f"{base_name}_{key.replace(':', '_')}.png"
+        texture_path = os.path.join(self.output_dir, texture_file)
+
+        texture = Texture(texture_file)
+        if previous and previous.get("key") == geom_key and os.path.exists(texture_path):
+            texture.read(Filename.fromOsSpecific(texture_path))
+            self.reused += 1
+        else:
+            image = self.bake_charts(corners, lights, columns, rows)
+            texture.setup2dTexture(width, height, Texture.T_unsigned_byte, Texture.F_rgb)
+            # Texture RAM images are BGR, with row 0 at v = 0 like the chart grid
+            pixels = np.clip(image[..., ::-1] * 255.0 / self.overbright, 0, 255).astype(np.uint8)
+            texture.setRamImage(pixels.tobytes())
+            texture.write(Filename.fromOsSpecific(texture_path))
+            self.baked += 1
+        # Referenced from the .bam relative to the output directory
+        texture.setFilename(Filename.fromOsSpecific(texture_file))
+        texture.setFullpath(Filename.fromOsSpecific(os.path.abspath(texture_path)))
+        texture.setMinfilter(Texture.FTLinear)
+        texture.setMagfilter(Texture.FTLinear)
+        texture.setWrapU(Texture.WMClamp)
+        texture.setWrapV(Texture.WMClamp)
+
+        geom_node.setGeom(geom_index, self.unweld(geom, triangles, columns, width, height))
+        stage = TextureStage(LIGHTMAP_NAME)
+        stage.setTexcoordName(LIGHTMAP_NAME)
+        stage.setMode(TextureStage.MModulate)
+        stage.setRgbScale(int(self.overbright))
+        stage.setSort(100)  # After the base color texture
+        state = geom_node.getGeomState(geom_index)
+        attrib = state.getAttrib(TextureAttrib) or TextureAttrib.makeDefault()
+        geom_node.setGeomState(geom_index, state.setAttrib(attrib.addOnStage(stage, texture)))
+        return {"key": geom_key, "texture": texture_file, "size": [width, height],
+                "triangles": len(triangles), "lights": [light["name"] for light in lights]}
+
+    def bake_charts(self, corners, lights, columns, rows):
+        """Light every chart texel; returns an (H, W, 3) float image."""
+        count, cell = len(corners), self.cell
+        texels = np.einsum("kj,tjc->tkc", self.weights, corners)  # (T, cell*cell, 3)
+        normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        normals = np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+        light = np.full(texels.shape, self.ambient)
+        for spot in lights:
+            to_light = np.array(spot["location"]) - texels
+            distance_sq = np.maximum((to_light ** 2).sum(axis=2), 1e-6)
+            to_light /= np.sqrt(distance_sq)[..., None]
+            direction = np.array(spot["direction"]) / np.linalg.norm(spot["direction"])
+            # Cone: full beyond the blended inner angle, zero outside spot_size / 2
+            cos_angle = -(to_light @ direction)
+            cos_outer = math.cos(spot["spot_size"] / 2)
+            cos_inner = math.cos(spot["spot_size"] / 2 * (1.0 - spot["spot_blend"]))
+            cone = smoothstep((cos_angle - cos_outer) / max(cos_inner - cos_outer, 1e-6))
+            # Two-sided Lambert: charts don't know which side of the face is visible
+            lambert = np.abs(np.einsum("tkc,tc->tk", to_light, normals))
+            strength = spot["intensity"] * self.exposure * cone * lambert / distance_sq
+            light += strength[..., None] * np.array(spot["color"])
+
+        # Lay the (T, cell, cell) charts out on a columns x rows grid
+        padded = np.zeros((columns * rows, cell * cell, 3))
+        padded[:count] = light
+        image = padded.reshape(rows, columns, cell, cell, 3).transpose(0, 2, 1, 3, 4)
+        return image.reshape(rows * cell, columns * cell, 3)
+
+    def unweld(self, geom, triangles, columns, width, height):
+        """
+        Return a copy of a Geom with one vertex per triangle corner and a
+        "lightmap" texcoord pointing into that triangle's chart.
+        """
+        vertex_data = geom.getVertexData()
+        old_format = vertex_data.getFormat()
+        lightmap_array = GeomVertexArrayFormat()
+        lightmap_array.addColumn(InternalName.getTexcoordName(LIGHTMAP_NAME), 2, Geom.NT_float32, Geom.C_texcoord)
+        new_format = GeomVertexFormat(old_format)
+        new_format.addArray(lightmap_array)
+        new_format = GeomVertexFormat.registerFormat(new_format)
+
+        order = triangles.ravel()
+        unwelded = GeomVertexData(vertex_data.getName(), new_format, Geom.UHStatic)
+        unwelded.uncleanSetNumRows(len(order))
+        for i in range(old_format.getNumArrays()):
+            stride = old_format.getArray(i).getStride()
+            rows = np.frombuffer(vertex_data.getArray(i).getHandle().getData(), dtype=np.uint8).reshape(-1, stride)
+            array = GeomVertexArrayData(new_format.getArray(i), Geom.UHStatic)
+            array.modifyHandle().copyDataFrom(rows[order].tobytes())
+            unwelded.setArray(i, array)
+
+        # Chart corners in texel space, matching chart_weights: (1,1), (cell-1,1), (1,cell-1)
+        cell = self.cell
+        chart = np.array([[1, 1], [cell - 1, 1], [1, cell - 1]], dtype=np.float64)
+        index = np.arange(len(triangles))
+        origin = np.stack([index % columns, index // columns], axis=1) * cell
+        uv = (origin[:, None, :] + chart[None]).reshape(-1, 2) / np.array([width, height])
+        array = GeomVertexArrayData(new_format.getArray(old_format.getNumArrays()), Geom.UHStatic)
+        array.modifyHandle().copyDataFrom(uv.astype(np.float32).tobytes())
+        unwelded.setArray(old_format.getNumArrays(), array)
+
+        primitive = GeomTriangles(Geom.UHStatic)
+        primitive.addConsecutiveVertices(0, len(order))
+        primitive.closePrimitive()
+        result = Geom(unwelded)
+        result.addPrimitive(primitive)
+        return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bake spot light lightmaps for a static model.")
+    parser.add_argument("--model", default="models/town.bam")
+    parser.add_argument("--lights", nargs="+", default=["models/town_spotlights.json"])
+    parser.add_argument("--output", default=None, help="Output directory (default: <model dir>/lightmaps)")
+    parser.add_argument("--cell", type=int, default=8, help="Chart size in texels per triangle")
+    parser.add_argument("--exposure", type=float, default=50.0)
+    parser.add_argument("--ambient", type=float, default=1.0)
+    parser.add_argument("--force", action="store_true", help="Rebake everything, ignoring the manifest")
+    args = parser.parse_args()
+    LightmapBaker(args.model, args.lights, args.output, cell=args.cell, ambient=args.ambient,
+                  exposure=args.exposure).bake(force=args.force)
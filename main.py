@@ -1,5 +1,37 @@
+import argparse
+import json
+
+from panda3d.core import loadPrcFileData
+
 from game import Game
+from game_log import set_level
+from profiler import profiler
 
 if __name__ == "__main__":
-    app = Game()
-    app.run()
+    parser = argparse.ArgumentParser(description="ShootingStar shooting gallery")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window or audio for a fixed number of ticks and print timings")
+    parser.add_argument("--seed", type=int, default=None, help="seed every random source for a reproducible run")
+    parser.add_argument("--ticks", type=int, default=600, help="number of ticks to run in headless mode")
+    parser.add_argument("--log-level", default=None, help="debug, info, warning or error (default: info)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="record per-frame phase and hot-path timings and write them to FILE (.csv or .json)")
+    parser.add_argument("--pstats", action="store_true", help="connect to a running PStats server")
+    args = parser.parse_args()
+
+    if args.log_level:
+        set_level(args.log_level)
+    if args.pstats:
+        loadPrcFileData("pstats", "want-pstats 1")
+    if args.profile:
+        profiler.start_recording()
+
+    app = Game(headless=args.headless, seed=args.seed)
+    if args.headless:
+        print(json.dumps(app.run_headless(args.ticks), indent=2))
+        if args.profile:
+            profiler.dump(args.profile)
+    else:
+        if args.profile:
+            app.finalExitCallbacks.append(lambda: profiler.dump(args.profile))
+        app.run()
@@ -1,62 +1,141 @@
-from panda3d.core import Point3
+from panda3d.core import Point3, NodePath
 from panda3d.bullet import BulletWorld, BulletRigidBodyNode, BulletBoxShape, BulletSphereShape
+import glob
+import json
 import os
 import random
-from direct.task.TaskManagerGlobal import taskMgr
+from collision_manager import set_collision_group
+from lightmap_baker import find_baked_model
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+TOWN_MODEL = "models/town.bam"
+PRELOAD_MANIFEST = "models/preload.json"
+
 
 class ModelLoader:
-    def __init__(self, loader, render, bullet_world, camera, fps_mode=False):
+    def __init__(self, loader, render, bullet_world, camera, fps_mode=False, load_async=False, scheduler=None):
         self.loader = loader
+        self.scheduler = scheduler  # SystemScheduler the gun-follow update runs in
         self.render = render
         self.bullet_world = bullet_world
         self.camera = camera
         self.fps_mode = fps_mode
+        self.cache = {}  # model path -> loaded prototype, never parented to the scene
+        self.ready = False
+        self.ready_callbacks = []
+        self.town = self.player = self.player_rigid_node = None
+        # Pre-lit by the spot light lightmaps when a current bake exists
+        self.town_path = find_baked_model(TOWN_MODEL) or TOWN_MODEL
+
+        # Everything in the preload manifest is read before the scene is built
+        paths = self.read_preload_manifest()
+        if load_async:
+            self.preload_async(paths, self.finish_loading)
+        else:
+            self.preload(paths)
+            self.finish_loading()
+
+    def read_preload_manifest(self, manifest_path=PRELOAD_MANIFEST):
+        """Return the model paths listed in the preload manifest, with glob patterns expanded."""
+        try:
+            with open(manifest_path) as f:
+                patterns = json.load(f)["models"]
+        except (OSError, ValueError, KeyError):
+            log.warning("No usable preload manifest at %s; models load on first use.", manifest_path)
+            return []
+        paths = []
+        for pattern in patterns:
+            matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+            paths.extend(self.town_path if path == TOWN_MODEL else path for path in matches)
+        return paths
+
+    def preload(self, paths):
+        """Load models into the cache, blocking until they are read."""
+        for path in paths:
+            if path not in self.cache:
+                self.store(path, self.loader.loadModel(path, okMissing=True))
+
+    def preload_async(self, paths, callback=None):
+        """
+        Load models into the cache on Panda's loader thread and call `callback()`
+        once all of them are resident. Returns the load request, which can
+        also be awaited from a coroutine task.
+        """
+        missing = [path for path in paths if path not in self.cache]
+        if not missing:
+            if callback:
+                callback()
+            return None
+
+        def on_loaded(models):
+            for path, model in zip(missing, models):
+                self.store(path, model)
+            if callback:
+                callback()
+        return self.loader.loadModel(missing, callback=on_loaded, okMissing=True)
+
+    def store(self, path, model):
+        if model is None:
+            log.warning("Could not preload '%s'", path)
+            return
+        model.detachNode()
+        self.cache[path] = model
+
+    def get_model(self, path):
+        """
+        Return a fresh copy of a cached model (loading it on a miss). The copy
+        has its own nodes but shares the Geoms, so it can be moved or edited
+        freely without touching the disk or duplicating vertex data.
+        """
+        prototype = self.cache.get(path)
+        if prototype is None:
+            prototype = self.loader.loadModel(path)
+            self.store(path, prototype)
+        return NodePath(prototype.node().copySubgraph())
+
+    def finish_loading(self):
+        """Build the models once their files are resident, then run the ready callbacks."""
         self.load_models()
-    def reload_models(self):
-        """ Reloads all models by first removing existing ones and then reloading them. """
-        # Remove previous models
-        if self.town:
-            self.town.removeNode()
-        if self.player:
-            self.player.removeNode()
-        if self.player_rigid_node:
-            self.bullet_world.removeRigidBody(self.player_rigid_node)
-        if self.town:
-            self.bullet_world.removeRigidBody(self.town)
-
-        # Clear references
-        self.town = None
-        self.player = None
-        self.player_rigid_node = None
-
-        # Re-run load_models
-        self.load_models()
-
+        self.ready = True
+        callbacks, self.ready_callbacks = self.ready_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def when_ready(self, callback):
+        """Call `callback()` once the models are loaded: now, or when the async preload finishes."""
+        if self.ready:
+            callback()
+        else:
+            self.ready_callbacks.append(callback)
     def load_models(self):
         # Load town model
-        self.town = self.loader.loadModel("models/town.bam")
+        self.town = self.get_model(self.town_path)
         self.town.reparentTo(self.render)
 
         # Add physics to the town
         town_rigid_node = BulletRigidBodyNode("town")
         town_shape = BulletBoxShape((10, 10, 1))
         town_rigid_node.addShape(town_shape)
+        set_collision_group(town_rigid_node, "static")
         town_node_path = self.render.attachNewNode(town_rigid_node)
         self.bullet_world.attachRigidBody(town_rigid_node)
 
         # Get player start position
         player_start = self.town.find("**/player_start")
         start_pos = player_start.getPos()
-        print(f"Found Player Starting Point: {start_pos}")
+        log.debug("Found Player Starting Point: %s", start_pos)
         player_start_pos = player_start.getPos() if not player_start.isEmpty() else Point3(3.1330947, -137.16002, 6.6172513)
 
         # Load player model
-        self.player = self.loader.loadModel("models/player.bam")
+        self.player = self.get_model("models/player.bam")
 
         # Create physics node for player
         self.player_rigid_node = BulletRigidBodyNode("player")
         player_shape = BulletSphereShape(1)
         self.player_rigid_node.addShape(player_shape)
+        set_collision_group(self.player_rigid_node, "player")
         self.player_node_path = self.render.attachNewNode(self.player_rigid_node)
         self.player_node_path.setPos(player_start_pos)
         self.bullet_world.attachRigidBody(self.player_rigid_node)
@@ -67,71 +146,70 @@ class ModelLoader:
 
         # Load gun and attach it only if FPS mode is active
         self.gun_mount = self.player.find("**/gun_mount")
-        self.gun = self.loader.loadModel("models/gun.bam")
+        self.gun = self.get_model("models/gun.bam")
 
         if self.fps_mode:
             if not self.gun_mount.isEmpty():
                 self.gun.reparentTo(self.camera)  # Reparent the gun to the camera in FPS mode
                 self.gun.setPos(0.3, 1.4, -0.3)  # Adjust gun's position relative to the camera
-                print("Gun mounted to camera for FPS mode.")
-                taskMgr.add(self.update_gun_position, "update_gun_position")  # Ensure it's updated
+                log.debug("Gun mounted to camera for FPS mode.")
+                self.scheduler.add_system("presentation", "gun_position", self.update_gun_position)  # Ensure it's updated
                 # Remove the other gun model (if it is parented to player)
                 self.remove_static_gun()
             else:
-                print("Warning: 'gun_mount' not found in player model!")
+                log.warning("'gun_mount' not found in player model!")
         else:
             if not self.gun_mount.isEmpty():
                 self.gun.reparentTo(self.player_node_path)
                 self.gun.setPos(self.gun_mount.getPos(self.player_node_path))
                 self.gun.setHpr(self.gun_mount.getHpr(self.player_node_path))
-                print("Gun mounted to player physics node.")
+                log.debug("Gun mounted to player physics node.")
             else:
-                print("Warning: 'gun_mount' not found in player model!")
+                log.warning("'gun_mount' not found in player model!")
 
         # Load and attach laser
         self.fire_dir = self.gun.find("**/fire_dir")
         if not self.fire_dir.isEmpty():
-            self.laser = self.loader.loadModel("models/lazer.bam")
+            self.laser = self.get_model("models/lazer.bam")
             self.laser.reparentTo(self.fire_dir)
             self.laser.setPos(0, 0, 0)
             self.laser.setScale(0.1)
-            print("Laser attached successfully.")
+            log.debug("Laser attached successfully.")
             # Remove the static laser (if it is not parented to the camera)
             self.remove_static_laser()
         else:
-            print("Warning: 'fire_dir' not found in gun model!")
+            log.warning("'fire_dir' not found in gun model!")
 
         # Find **/cat node and replace it with models/cat.bam
         cat_node = self.town.find("**/cat")
         if not cat_node.isEmpty():
             # Load the new cat model
-            cat_model = self.loader.loadModel("models/cat.bam")
+            cat_model = self.get_model("models/cat.bam")
             cat_model.reparentTo(cat_node)
             cat_model.setPos(0, 0, 0)  # Adjust the position as needed
-            print("Cat model replaced successfully.")
+            log.debug("Cat model replaced successfully.")
         else:
-            print("Warning: 'cat' node not found in town model!")
+            log.warning("'cat' node not found in town model!")
 
-    def update_gun_position(self, task):
+    def update_gun_position(self, dt):
         """Update the position of the gun relative to the camera"""
         if self.fps_mode:
             offset = (0.3, 1.4, -0.3)
             self.gun.setPos(self.camera, *offset)  # Set position relative to camera
-        return task.cont
 
     def remove_static_gun(self):
         """Remove the gun that is not moving with the camera"""
         static_gun = self.player.find("**/gun")  # Find the other gun (non-camera mounted)
         if static_gun:
             static_gun.removeNode()  # Remove the node if it's not the camera-attached gun
-            print("Removed static gun.")
+            log.debug("Removed static gun.")
 
     def remove_static_laser(self):
         """Remove the laser that is not moving with the camera"""
         static_laser = self.gun.find("**/laser")  # Find the other laser (non-camera mounted)
         if static_laser:
             static_laser.removeNode()  # Remove the node if it's not the camera-attached laser
-            print("Removed static laser.")
+            log.debug("Removed static laser.")
 
     def get_geometries(self, model):
         """ Extracts all GeomNodes from a given model. """
@@ -143,5 +221,5 @@ class ModelLoader:
         return geometries
 
     def load_single_model(self, model_path):
-        """Load a single model given the path."""
-        return self.loader.loadModel(model_path)
+        """Load a single model given the path (a copy of the cached model)."""
+        return self.get_model(model_path)
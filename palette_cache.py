@@ -0,0 +1,74 @@
+import numpy as np
+from panda3d.core import PNMImage
+
+
+class PaletteCache:
+    """
+    Compact color palettes for textures, built once per texture and kept by
+    texture path. A palette is the texture's most common colors (quantized)
+    with their frequencies, so shard tints can be drawn in one vectorized call
+    instead of reading the whole texture back on every hit.
+    """
+
+    def __init__(self, max_colors=64, sample_stride=8, quantize_bits=4):
+        self.max_colors = max_colors
+        self.sample_stride = sample_stride  # Only every Nth pixel in each direction is looked at
+        self.quantize_bits = quantize_bits
+        self.palettes = {}  # texture key -> (colors (K, 4) float32, weights (K,))
+
+    def key(self, texture):
+        fullpath = texture.getFullpath()
+        return fullpath.getFullpath() if not fullpath.empty() else texture.getName()
+
+    def preload(self, textures):
+        """Build palettes for the given textures up front."""
+        for texture in textures:
+            self.get_palette(texture)
+
+    def get_palette(self, texture):
+        """Return (colors, weights) for a texture, building the palette on first use."""
+        key = self.key(texture)
+        palette = self.palettes.get(key)
+        if palette is None:
+            palette = self.palettes[key] = self.build_palette(self.read_pixels(texture))
+        return palette
+
+    def read_pixels(self, texture):
+        """Return a subsampled (N, 3) uint8 array of the texture's RGB pixels."""
+        if texture.hasRamImage() or texture.mightHaveRamImage():
+            data = texture.getRamImageAs("RGB")
+            if data:
+                pixels = np.frombuffer(data, dtype=np.uint8).reshape(texture.getYSize(), texture.getXSize(), 3)
+                return pixels[::self.sample_stride, ::self.sample_stride].reshape(-1, 3)
+
+        # No RAM copy (e.g. already uploaded and released); fall back to one PNMImage readback
+        image = PNMImage()
+        texture.store(image)
+        xs = range(0, image.getXSize(), self.sample_stride)
+        ys = range(0, image.getYSize(), self.sample_stride)
+        return np.array([image.getXelVal(x, y) for y in ys for x in xs], dtype=np.uint8).reshape(-1, 3)
+
+    def build_palette(self, pixels):
+        """Quantize pixels and keep the most frequent colors, weighted by frequency."""
+        if len(pixels) == 0:
+            return np.ones((1, 4), dtype=np.float32), np.ones(1)
+        shift = 8 - self.quantize_bits
+        quantized = (pixels >> shift).astype(np.uint32)
+        codes = (quantized[:, 0] << (2 * self.quantize_bits)) | (quantized[:, 1] << self.quantize_bits) | quantized[:, 2]
+        unique, inverse, counts = np.unique(codes, return_inverse=True, return_counts=True)
+
+        # Average the real pixel colors falling into each bucket, rather than using bucket corners
+        sums = np.zeros((len(unique), 3))
+        np.add.at(sums, inverse, pixels)
+        means = sums / counts[:, None]
+
+        top = np.argsort(counts)[::-1][:self.max_colors]
+        colors = np.ones((len(top), 4), dtype=np.float32)
+        colors[:, :3] = means[top] / 255.0
+        weights = counts[top] / counts[top].sum()
+        return colors, weights
+
+    def sample(self, texture, count, rng=np.random):
+        """Draw `count` RGBA colors (0..1) from a texture's palette."""
+        colors, weights = self.get_palette(texture)
+        return colors[rng.choice(len(colors), size=count, p=weights)]
@@ -4,20 +4,91 @@ from panda3d.core import *
 from panda3d.bullet import *
 from scipy.spatial import Voronoi
 from panda3d.bullet import BulletDebugNode
-from panda3d.bullet import BulletCapsuleShape, BulletRigidBodyNode, ZUp, BulletConvexHullShape
+from panda3d.bullet import BulletCapsuleShape, BulletRigidBodyNode, ZUp
 from panda3d.core import Geom, GeomNode, GeomVertexData, GeomVertexFormat, GeomTriangles
 from panda3d.core import GeomVertexWriter, GeomTristrips, GeomTriangles
 from panda3d.core import LMatrix3f  # For single precision
-from panda3d.core import LVecBase3f
 from shapely.geometry import Polygon, box
 import os
 from panda3d.core import NodePath
 from panda3d.core import PNMImage
+from fracture_cache import FractureTemplateCache
+from shard_batch import ShardBatch
+from shard_pool import ShardPool
+from fracture_jobs import FractureJobs
+from palette_cache import PaletteCache
+from collision_manager import set_collision_group
+from game_log import get_logger
+from profiler import profiler, profiled
+import time
+
+log = get_logger(__name__)
+
+
+class PhysicsStepper:
+    """
+    Fixed-tick simulation loop for a BulletWorld. Frame time is accumulated and
+    consumed in `1 / tick_rate` steps, at most `max_substeps` per frame (slow
+    frames run the simulation slower rather than spiralling). Between ticks
+    Bullet interpolates the motion states of dynamic bodies - bottles, pellets
+    and shards alike - so visuals stay smooth at any frame rate.
+    """
+
+    def __init__(self, bullet_world, tick_rate=120, max_substeps=4):
+        self.bullet_world = bullet_world
+        self.tick_rate = tick_rate
+        self.max_substeps = max_substeps
+        self.last_substeps = 0
+        self.last_step_ms = 0.0
+        self.total_substeps = 0
+        self.frames = 0
+        self.dropped_time = 0.0  # Simulation time lost to the substep cap
+        self.section = profiler.section("doPhysics")
+
+    def step(self, dt):
+        """Advance the simulation by one frame of `dt` seconds and return the substeps taken."""
+        stepsize = 1.0 / self.tick_rate
+        start = time.perf_counter()
+        # Bullet reports the ticks that were due, including any beyond the cap
+        with self.section:
+            substeps = min(self.bullet_world.doPhysics(dt, self.max_substeps, stepsize), self.max_substeps)
+        self.last_step_ms = (time.perf_counter() - start) * 1000.0
+        self.last_substeps = substeps
+        self.total_substeps += substeps
+        self.frames += 1
+        if dt > self.max_substeps * stepsize:
+            self.dropped_time += dt - self.max_substeps * stepsize
+        return substeps
+
+    def get_stats(self):
+        return {
+            "substeps": self.last_substeps,
+            "step_ms": self.last_step_ms,
+            "avg_substeps": self.total_substeps / self.frames if self.frames else 0.0,
+            "dropped_time": self.dropped_time,
+        }
+
+
 class BulletPhysics:
-    def __init__(self, bullet_world, render):
+    def __init__(self, bullet_world, render, batched_shards=True, max_live_shards=1024,
+                 tick_rate=120, max_substeps=4):
         self.bullet_world = bullet_world
         self.render = render
-        self.break_sound = base.loader.loadSfx("break.wav")
+        self.stepper = PhysicsStepper(bullet_world, tick_rate, max_substeps)
+
+        # Precomputed fracture patterns, so break_bottle never runs Voronoi on the hit frame
+        self.fracture_cache = FractureTemplateCache()
+        # Misses (and optional unique per-hit fractures) are computed off the main thread
+        self.fracture_jobs = FractureJobs(self.fracture_cache)
+        # Shard tints come from per-texture palettes instead of a texture readback per hit
+        self.palette_cache = PaletteCache()
+
+        # Render all shards of a break as one Geom instead of one GeomNode per shard
+        self.batched_shards = batched_shards
+
+        # Recycled shard bodies under a global budget, so debris can't pile up over a long session
+        self.shard_pool = ShardPool(self.bullet_world, self.render, max_live_shards=max_live_shards,
+                                    reference=base.camera)
 
         # Debug node for visualizing the physics world
         self.debug_node = BulletDebugNode('Debug')
@@ -27,12 +98,22 @@ class BulletPhysics:
         # Start debug rendering task
     def update(self, task):
         # Step the physics simulation
-        dt = globalClock.getDt()
-        self.bullet_world.do_physics(dt)
+        self.step(globalClock.getDt())
 
         # The debug visualization is automatically updated during do_physics()
         return task.cont
 
+    def step(self, dt):
+        """Run the fixed-tick simulation for one frame, then update the shards."""
+        self.stepper.step(dt)
+        self.update_shards()
+
+    def update_shards(self):
+        """Commit finished fractures, despawn resting debris and push shard body
+        transforms into the batched geometry."""
+        self.commit_fractures()
+        self.shard_pool.update()
+
     def setup_temple_collision(self, temple_model):
         """ Set up temple collision using Bullet physics. """
         # Create a BulletTriangleMesh to collect temple collision geometries
@@ -52,6 +133,7 @@ class BulletPhysics:
         # Create a BulletRigidBodyNode for the temple's collision body
         temple_phys = BulletRigidBodyNode('temple')
         temple_phys.addShape(shape)
+        set_collision_group(temple_phys, "static")
 
         # Attach the physical representation of the temple to the model
         temple_model.attachNewNode(temple_phys)
@@ -69,55 +151,13 @@ class BulletPhysics:
         player_shape = BulletCapsuleShape(radius, cylinder_height, ZUp)
         player_phys = BulletRigidBodyNode('player')
         player_phys.addShape(player_shape)
+        set_collision_group(player_phys, "player")
         player_np = self.render.attachNewNode(player_phys)
         self.bullet_world.attachRigidBody(player_phys)
 
         # Reparent the player model to the physics node
         player_model.reparentTo(player_np)
 
-    def setup_bottle_physics(self, bottle_model):
-        """ Setup bottle collision physics, possibly for shattering. """
-        shards = bottle_model.findAllMatches("**/bottle_shard*")
-        if shards.isEmpty():
-            shape = BulletSphereShape(1)
-            bottle_phys = BulletRigidBodyNode('bottle')
-            bottle_phys.addShape(shape)
-            bottle_model.attachNewNode(bottle_phys)
-            self.bullet_world.attachRigidBody(bottle_phys)
-            return
-
-        for shard in shards:
-            shape = BulletConvexHullShape()
-            for geom in shard.node().getGeoms():
-                shape.addGeom(geom)
-            shard_phys = BulletRigidBodyNode(f"shard_{shard.getName()}")
-            shard_phys.addShape(shape)
-            shard_phys.setMass(0.1)
-            shard_phys.setInertia(LVecBase3f(0.0,0.0,0.0))
-             # Zero inertia to prevent immediate movement
-            shard_phys.setDeactivationEnabled(False)  # Prevent auto-deactivation
-            shard_phys.set_active(True)  # Activate the rigid body
-  # Set to active state
-            shard_phys.setLinearDamping(0)  # Disable linear damping
-            shard_phys.setAngularDamping(0)  # Disable angular damping
-            shard_phys.setGravity(LVector3(0,0,0))  # Disable gravity effect
-            shard_phys.setFriction(0.5)  # Set appropriate friction
-            shard_phys.setRestitution(0.5)  # Set appropriate restitution
-            shard_phys.setRollingFriction(0.1)  # Set rolling friction
-            shard_phys.setSpinningFriction(0.1)  # Set spinning friction
-            shard_phys.setCcdMotionThreshold(0.1)  # Set CCD motion threshold
-            shard_phys.setCcdSweptSphereRadius(0.2)  # Set CCD swept sphere radius
-            shard_phys.setContactProcessingThreshold(0.01)  # Set contact processing threshold
-            shard_phys.setLinearSleepingThreshold(0.8)  # Set linear sleeping threshold
-            shard_phys.setAngularSleepingThreshold(1.0)  # Set angular sleeping threshold
-            shard_phys.setLinearFactor(Vec3(1, 1, 1))  # Enable linear movement
-            shard_phys.setAngularFactor(Vec3(1, 1, 1))  # Enable angular movement
-            #shard_phys.setDamping(0.1, 0.1)  # Set damping factors
-            phys_node = base.render.attachNewNode(shard_phys)
-            self.bullet_world.attachRigidBody(shard_phys)
-            phys_node.setPos(shard.getPos())
-            phys_node.setHpr(shard.getHpr())
-
     def on_mouse_click(self, camera, render):
         """ Handle mouse click to break bottle on hit. """
         if base.mouseWatcherNode.hasMouse():
@@ -150,104 +190,77 @@ class BulletPhysics:
                 largest = max(clipped.geoms, key=lambda p: p.area)
                 return list(largest.exterior.coords)
         except Exception as e:
-            print(f"Error clipping region: {e}")
+            log.warning("Error clipping region: %s", e)
             return None
 
 
 
+    @profiled("break_bottle")
     def break_bottle(self, hit_phys, position):
-        """Handle bottle breaking into shards using Voronoi tessellation,
-        cutting the bottle's mesh and parenting the mesh pieces to the physics shards.
-        Shards are placed at the hit position."""
+        """Handle bottle breaking into shards using a precomputed Voronoi fracture
+        template. The fracture is planned on a worker thread; its shards are
+        committed around the hit position by commit_fractures() on a later frame."""
         if not hasattr(hit_phys, 'destroyed') or hit_phys.destroyed or not hasattr(hit_phys, 'node'):
             return
         
-        print(f"Breaking bottle at position: {position}")
-
-        # Extract original texture
-        original_texture = hit_phys.node.getTexture() if hit_phys.node.hasTexture() else None
-        tex_image = None
+        log.debug("Breaking bottle at position: %s", position)
 
-        if original_texture:
-            print("Bottle texture found, applying random colors from texture.")
-            tex_image = PNMImage()
-            original_texture.store(tex_image)
-        else:
-            print("No texture found. Using default color.")
+        # Extract original texture (bottle models carry it on a child GeomNode)
+        original_texture = hit_phys.node.getTexture() if hit_phys.node.hasTexture() else hit_phys.node.findTexture("*Text")
 
-        # Generate Voronoi points
-        num_points = 128
-        points = np.vstack(([0, 0, 0], np.random.uniform(-1, 1, (num_points - 1, 3))))
-        
-        print(f"Generated Voronoi points: {points}")
-
-        # Define bounding box in XY plane for clipping
-        clip_bbox = box(-1, -1, 1, 1)
-        vor = Voronoi(points)
-        print(f"Voronoi regions: {len(vor.regions)} regions generated.")
-
-        for i, region in enumerate(vor.regions):
-            if not region or -1 in region:
-                continue
-
-            # Convert 2D Voronoi region points to 3D
-            final_region = [tuple(points[idx]) for idx in region if 0 <= idx < len(points)]
-            if not final_region:
-                continue
-
-            # Create GeomVertexData
-            vertex_data = GeomVertexData("shard", GeomVertexFormat.getV3(), Geom.UHStatic)
-            vertex_writer = GeomVertexWriter(vertex_data, "vertex")
-            
-            for pt in final_region:
-                vertex_writer.addData3f(*pt)
-
-            # Create triangles
-            geom_triangles = GeomTriangles(Geom.UHStatic)
-            num_vertices = vertex_data.getNumRows()
-            
-            for j in range(0, num_vertices - 2, 3):
-                geom_triangles.addVertices(j, j + 1, j + 2)
-
-            # Assemble geometry
-            geom = Geom(vertex_data)
-            geom.addPrimitive(geom_triangles)
-            
-            # Create GeomNode and apply texture
-            geom_node = GeomNode(f"shard_geom_{i}")
-            geom_node.addGeom(geom)
-            geom_node_path = base.render.attachNewNode(geom_node)
-
-            # Assign a random color from the texture
-            if tex_image:
-                tex_width, tex_height = tex_image.getXSize(), tex_image.getYSize()
-                rand_x = random.randint(0, tex_width - 1)
-                rand_y = random.randint(0, tex_height - 1)
-                r, g, b = tex_image.getXel(rand_x, rand_y)
-                geom_node_path.setColor(r, g, b, 1)
-            else:
-                geom_node_path.setColor(random.uniform(0.5, 1), random.uniform(0.5, 1), random.uniform(0.5, 1), 1)
+        # Seed drawn here, so a seeded run breaks bottles the same way whichever thread plans it
+        self.fracture_jobs.submit(getattr(hit_phys, 'model_path', None), Point3(position),
+                                  original_texture, random.getrandbits(32))
 
-            # Create Bullet physics shape
-            shape = BulletConvexHullShape()
-            shape.addGeom(geom)
-            piece_phys = BulletRigidBodyNode(f"piece_{i}")
-            piece_phys.addShape(shape)
-            piece_phys.setMass(0.1)
+        # Remove the original bottle
+        log.debug("Removing original hit_phys object.")
+        hit_phys.cleanup()
 
-            # Apply physics properties
-            impulse = Vec3(*np.random.uniform(-10, 10, 3))
-            piece_phys.applyCentralImpulse(impulse)
+    def commit_fractures(self):
+        """Spawn the shards of finished fracture jobs, within the jobs' per-frame time budget."""
+        for job in self.fracture_jobs.collect():
+            self.spawn_shards(job["template"], job["position"], job["texture"], job["offsets"], job["impulses"])
 
-            # Attach to scene
-            phys_node = base.render.attachNewNode(piece_phys)
-            phys_node.setPos(position + Vec3(*np.random.uniform(-0.1, 0.1, 3)))
-            geom_node_path.reparentTo(phys_node)
+    @profiled("spawn_shards")
+    def spawn_shards(self, template, position, original_texture, offsets, impulses):
+        """Instantiate a fracture template's shards, parenting the shard meshes to the physics shards."""
+        geoms = None if self.batched_shards else template.get_geoms()
+        shapes = template.get_shapes()
 
-            # Add to physics world
-            self.bullet_world.attachRigidBody(piece_phys)
-            print(f"Shard {i} added to scene.")
+        # Pick one color per shard, from the bottle texture's palette when there is one
+        if original_texture:
+            colors = self.palette_cache.sample(original_texture, template.shard_count)
+        else:
+            colors = np.ones((template.shard_count, 4))
+            colors[:, :3] = np.random.uniform(0.5, 1, (template.shard_count, 3))
+
+        # Make room under the live-shard budget before taking bodies from the pool
+        self.shard_pool.make_room(template.shard_count)
+        shards = []
+        for i in range(template.shard_count):
+            # Bullet hull shapes are shared with every other break using this template
+            shard = self.shard_pool.acquire(
+                shapes[i], 0.1, position + Vec3(*offsets[i]),
+                geom=None if self.batched_shards else geoms[i], color=colors[i])
 
-        # Remove the original bottle
-        print("Removing original hit_phys object.")
-        hit_phys.cleanup()
+            # Apply physics properties
+            shard.body.applyCentralImpulse(Vec3(*impulses[i]))
+            shards.append(shard)
+
+        if self.batched_shards:
+            # One Geom for the whole break, animated by the shard bodies
+            batch = ShardBatch(template, [shard.body for shard in shards], colors, base.render,
+                               geom_node=self.shard_pool.take_batch_node())
+            self.shard_pool.add_batch(batch, shards)
+
+        log.debug("%d shards added to scene.", template.shard_count)
+
+    def reset(self):
+        """Drop queued fractures and release all debris, keeping the workers and caches."""
+        self.fracture_jobs.cancel_pending()
+        self.shard_pool.clear()
+
+    def cleanup(self):
+        """Release all debris and stop the fracture workers."""
+        self.fracture_jobs.shutdown()
+        self.shard_pool.clear()
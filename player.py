@@ -1,5 +1,9 @@
 from panda3d.core import BitMask32, Vec3
 from panda3d.bullet import BulletCapsuleShape, BulletRigidBodyNode
+from collision_manager import set_collision_group
+from game_log import get_logger
+
+log = get_logger(__name__)
 
 class PlayerPhysics:
     def __init__(self, player_model, bullet_world):
@@ -34,7 +38,7 @@ class PlayerPhysics:
         # Attach Bullet node to the player model
         self.bullet_node_path = self.player_model.attachNewNode(self.bullet_rigid_body)
         self.bullet_node_path.setPos(self.player_model.getPos())  # Align with player model
-        self.bullet_node_path.setCollideMask(BitMask32.bit(1))  # Set collision mask
+        set_collision_group(self.bullet_node_path, "player")  # Set collision group
 
         # Attach the rigid body to the physics world
         self.bullet_world.attachRigidBody(self.bullet_rigid_body)
@@ -74,6 +78,6 @@ class PlayerPhysics:
 
         # Debugging output
         if self.is_on_ground:
-            print("Player is on the ground!")
+            log.debug("Player is on the ground!")
         else:
-            print("Player is in the air!")
+            log.debug("Player is in the air!")
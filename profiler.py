@@ -0,0 +1,197 @@
+import csv
+import functools
+import json
+import math
+import os
+import time
+from collections import deque
+
+import numpy as np
+from panda3d.core import PStatCollector
+
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+# Histogram bin edges in milliseconds; the last bin catches everything over two 60 Hz frames
+HISTOGRAM_EDGES_MS = (0.0, 0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 16.7, 33.3, math.inf)
+
+
+class RollingTimings:
+    """The last `window` samples of one timing, in milliseconds."""
+
+    def __init__(self, window=600):
+        self.samples = deque(maxlen=window)
+        self.count = 0  # Every sample ever added, not just the window
+
+    def add(self, elapsed_ms):
+        self.samples.append(elapsed_ms)
+        self.count += 1
+
+    def histogram(self):
+        """Return {bin label: sample count} over HISTOGRAM_EDGES_MS."""
+        counts, _ = np.histogram(np.fromiter(self.samples, float, len(self.samples)), bins=HISTOGRAM_EDGES_MS)
+        labels = [f"<{high:g}" if high != math.inf else f">={low:g}"
+                  for low, high in zip(HISTOGRAM_EDGES_MS, HISTOGRAM_EDGES_MS[1:])]
+        return dict(zip(labels, counts.tolist()))
+
+    def summary(self):
+        if not self.samples:
+            return {"count": self.count, "mean_ms": 0.0, "p50_ms": 0.0, "p90_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0}
+        samples = np.fromiter(self.samples, float, len(self.samples))
+        p50, p90, p99 = np.percentile(samples, (50, 90, 99))
+        return {
+            "count": self.count,
+            "mean_ms": float(samples.mean()),
+            "p50_ms": float(p50),
+            "p90_ms": float(p90),
+            "p99_ms": float(p99),
+            "max_ms": float(samples.max()),
+            "histogram": self.histogram(),
+        }
+
+
+class Section:
+    """
+    A named hot path: a PStats collector ("Game:<name>") plus wall-clock timing.
+    Used as a context manager; sections may nest but a section must not
+    re-enter itself.
+    """
+
+    __slots__ = ("name", "collector", "timings", "frame_ms", "frame_calls", "start_time")
+
+    def __init__(self, name, window):
+        self.name = name
+        self.collector = PStatCollector(f"Game:{name}")
+        self.timings = RollingTimings(window)  # Per call
+        self.frame_ms = 0.0
+        self.frame_calls = 0
+        self.start_time = 0.0
+
+    def __enter__(self):
+        self.collector.start()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = (time.perf_counter() - self.start_time) * 1000.0
+        self.collector.stop()
+        self.timings.add(elapsed)
+        self.frame_ms += elapsed
+        self.frame_calls += 1
+        return False
+
+
+class FrameProfiler:
+    """
+    Rolling timing histograms for the scheduler phases, the whole frame and
+    the named hot-path sections. The scheduler reports each phase and closes
+    the frame; while recording, every frame also becomes one row (phase times
+    plus each section's time and call count) for dump_csv()/dump_json().
+    Live views of the same sections are available in PStats.
+    """
+
+    def __init__(self, window=600, max_records=36000):
+        self.window = window
+        self.sections = {}
+        self.phases = {}
+        self.frame_timings = RollingTimings(window)
+        self.frame = 0
+        self.frame_row = {}
+        self.recording = False
+        self.records = deque(maxlen=max_records)
+
+    def section(self, name):
+        """Return the Section for `name`, creating it on first use."""
+        section = self.sections.get(name)
+        if section is None:
+            section = self.sections[name] = Section(name, self.window)
+        return section
+
+    def add_phase(self, phase, elapsed_ms):
+        timings = self.phases.get(phase)
+        if timings is None:
+            timings = self.phases[phase] = RollingTimings(self.window)
+        timings.add(elapsed_ms)
+        if self.recording:
+            self.frame_row[f"{phase}_ms"] = elapsed_ms
+
+    def end_frame(self, frame_ms):
+        """Close the frame: store its row when recording and reset the per-frame section counters."""
+        self.frame_timings.add(frame_ms)
+        if self.recording:
+            row = {"frame": self.frame, "frame_ms": frame_ms}
+            row.update(self.frame_row)
+            for name, section in self.sections.items():
+                row[f"{name}_ms"] = section.frame_ms
+                row[f"{name}_calls"] = section.frame_calls
+            self.records.append(row)
+            self.frame_row = {}
+        for section in self.sections.values():
+            section.frame_ms = 0.0
+            section.frame_calls = 0
+        self.frame += 1
+
+    def reset(self):
+        """Drop every timing window and recorded frame, keeping the sections and their collectors."""
+        for section in self.sections.values():
+            section.timings = RollingTimings(self.window)
+        self.phases.clear()
+        self.frame_timings = RollingTimings(self.window)
+        self.records.clear()
+        self.frame_row = {}
+
+    def start_recording(self):
+        self.records.clear()
+        self.recording = True
+
+    def stop_recording(self):
+        self.recording = False
+
+    def dump_csv(self, path):
+        """Write the recorded frames as CSV, one row per frame."""
+        fieldnames = {}
+        for row in self.records:
+            fieldnames.update(dict.fromkeys(row))  # Sections first seen mid-run get their own columns
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(fieldnames), restval=0)
+            writer.writeheader()
+            writer.writerows(self.records)
+        log.info("Wrote %d profiled frames to %s", len(self.records), path)
+
+    def dump_json(self, path):
+        """Write the summary statistics and the recorded frames as JSON."""
+        with open(path, "w") as f:
+            json.dump({"summary": self.get_stats(), "frames": list(self.records)}, f, indent=1)
+        log.info("Wrote %d profiled frames to %s", len(self.records), path)
+
+    def dump(self, path):
+        """Write CSV for a .csv path and JSON for anything else."""
+        if os.path.splitext(path)[1].lower() == ".csv":
+            self.dump_csv(path)
+        else:
+            self.dump_json(path)
+
+    def get_stats(self):
+        return {
+            "frame": self.frame_timings.summary(),
+            "phases": {phase: timings.summary() for phase, timings in self.phases.items()},
+            "sections": {name: section.timings.summary() for name, section in self.sections.items()},
+        }
+
+
+# The profiler the game's scheduler and every @profiled hot path report to
+profiler = FrameProfiler()
+
+
+def profiled(name):
+    """Decorator: time every call of the function as the profiler section `name`."""
+    def decorate(func):
+        section = profiler.section(name)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with section:
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,166 @@
+from panda3d.core import Point3, TransformState, Vec3
+from panda3d.bullet import BulletRigidBodyNode, BulletSphereShape
+from collision_manager import collision_mask, set_collision_group
+from profiler import profiled
+
+
+class Projectile:
+    """One pooled pellet: its body, where it was fired from and where it was last tick."""
+
+    __slots__ = ("np", "body", "spawn_time", "origin", "previous")
+
+    def __init__(self, np):
+        self.np = np
+        self.body = np.node()
+        self.spawn_time = 0.0
+        self.origin = Point3()
+        self.previous = Point3()
+
+
+class ProjectileSystem:
+    """
+    A fixed pool of pellet bodies advanced by one task. Every frame each live
+    pellet's movement since the last frame is swept against bottles and static
+    geometry, so a fast pellet can't pass through a bottle between two frames,
+    and pellets are retired after `max_lifetime` seconds or `max_distance`
+    units from the muzzle.
+    """
+
+    def __init__(self, game, bottle_manager, on_hit, pool_size=32, speed=512, radius=2.0,
+                 mass=3.0, model_path="models/bullet.bam", model_scale=1.4,
+                 max_lifetime=2.0, max_distance=200.0, hit_radius=5.0):
+        self.game = game
+        self.render = game.render
+        self.bullet_world = game.bullet_world
+        self.bottle_manager = bottle_manager
+        self.on_hit = on_hit  # Called as on_hit(bottle, hit_point)
+        self.speed = speed
+        self.max_lifetime = max_lifetime
+        self.max_distance = max_distance
+        self.hit_radius = hit_radius  # Near-miss radius around the pellet's position at the end of a sweep
+        self.sweep_shape = BulletSphereShape(radius)
+        self.sweep_mask = collision_mask("bottle") | collision_mask("static")
+
+        # Loaded once; each pooled pellet shows an instance of it
+        self.model = game.model_loader.load_single_model(model_path)
+        self.model.setScale(model_scale)
+
+        self.live = []
+        self.free = [self.make_projectile(radius, mass) for _ in range(pool_size)]
+        self.fired = 0
+        self.recycled = 0
+        self.hits = 0
+        self.expired = 0
+
+        # Runs after physics has moved the pellets, ahead of the contact hits
+        game.scheduler.add_system("hit_resolution", "projectiles", self.update)
+
+    def make_projectile(self, radius, mass):
+        body = BulletRigidBodyNode("pellet")
+        body.setMass(mass)
+        body.addShape(BulletSphereShape(radius))
+        # Swept-sphere CCD so the physical pellet doesn't tunnel through thin geometry either
+        body.setCcdMotionThreshold(1.0)
+        body.setCcdSweptSphereRadius(1.0)
+        set_collision_group(body, "pellet")
+        np = self.render.attachNewNode(body)
+        body.setPythonTag("pellet", np)  # Lets the HitDispatcher report its bottle contacts
+        self.model.instanceTo(np)
+        np.detachNode()
+        return Projectile(np)
+
+    def fire(self, transform, direction):
+        """Launch a pellet with `transform` (world space) along `direction`. Returns the Projectile."""
+        if self.free:
+            projectile = self.free.pop()
+        else:
+            # Pool exhausted: the oldest pellet in flight is reused
+            projectile = self.live.pop(0)
+            self.bullet_world.removeRigidBody(projectile.body)
+            self.recycled += 1
+
+        projectile.np.reparentTo(self.render)
+        projectile.np.setTransform(transform)
+        body = projectile.body
+        body.clearForces()
+        body.setAngularVelocity(Vec3(0, 0, 0))
+        body.setLinearVelocity(direction * self.speed)
+        self.bullet_world.attachRigidBody(body)
+        body.setActive(True, True)
+
+        projectile.spawn_time = globalClock.getFrameTime()
+        projectile.origin = projectile.np.getPos(self.render)
+        projectile.previous = Point3(projectile.origin)
+        self.live.append(projectile)
+        self.fired += 1
+        return projectile
+
+    def release(self, projectile):
+        """Take a pellet out of the world and back into the pool."""
+        self.bullet_world.removeRigidBody(projectile.body)
+        projectile.np.detachNode()
+        self.free.append(projectile)
+
+    def update(self, dt):
+        """Sweep every live pellet over the path it flew this frame and retire expired ones."""
+        now = globalClock.getFrameTime()
+        survivors = []
+        for projectile in self.live:
+            current = projectile.np.getPos(self.render)
+            self.sweep(projectile.previous, current)
+            projectile.previous = current
+
+            if (now - projectile.spawn_time > self.max_lifetime
+                    or (current - projectile.origin).length() > self.max_distance):
+                self.release(projectile)
+                self.expired += 1
+            else:
+                survivors.append(projectile)
+        self.live = survivors
+
+    @profiled("projectile_sweep")
+    def sweep(self, start, end):
+        """
+        Break the bottle the pellet's sphere swept into this frame or, failing
+        that, the nearest live bottle within hit_radius of where the sweep
+        stopped (the contact point, or the end of the segment). One bottle at most.
+        """
+        point = end
+        if start != end:
+            result = self.bullet_world.sweepTestClosest(
+                self.sweep_shape, TransformState.makePos(start), TransformState.makePos(end), self.sweep_mask)
+            if result.hasHit():
+                point = result.getHitPos()
+                node = result.getNode()
+                if node.hasPythonTag("bottle") and not node.getPythonTag("bottle").destroyed:
+                    self.hits += 1
+                    self.on_hit(node.getPythonTag("bottle"), point)
+                    return
+
+        # Near miss: only around where the pellet is, not along the whole frame's flight
+        for bottle in self.bottle_manager.bottles_near(point, self.hit_radius):
+            if not bottle.destroyed:
+                self.hits += 1
+                self.on_hit(bottle, self.bottle_manager.index.get_pos(bottle))
+                return
+
+    def reset(self):
+        """Return every live pellet to the pool."""
+        for projectile in self.live:
+            self.release(projectile)
+        self.live = []
+
+    def cleanup(self):
+        """Return every pellet to the pool and stop updating."""
+        self.reset()
+        self.game.scheduler.remove_system("projectiles")
+
+    def get_stats(self):
+        return {
+            "live": len(self.live),
+            "free": len(self.free),
+            "fired": self.fired,
+            "recycled": self.recycled,
+            "hits": self.hits,
+            "expired": self.expired,
+        }
@@ -0,0 +1,250 @@
+import argparse
+import json
+import math
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+from panda3d.core import ClockObject, PStatClient, Point3, loadPrcFileData
+
+from benchmark import percentiles
+from game import Game
+
+# text-stats prints one block per frame: a "Thread <name> frame <n>, <ms> ms" header, then
+# "<indent><collector> = <value> <unit>" lines, two spaces of indent per collector level
+FRAME_HEADER = re.compile(r"^Thread (.+) frame (\d+), ([\d.eE+-]+) ms")
+COLLECTOR_LINE = re.compile(r"^(  +)(.*?) = ([\d.eE+-]+|nan|inf) ?(\S*)$")
+UNIT_SCALE = {"K": 1e3, "M": 1e6}
+# tinydisplay never fills "Primitive batches", so a draw call is counted as one Geom sent to the
+# renderer: the "Geoms" level, which every GSG raises once per Geom it draws
+DRAW_CALL_COLLECTOR = "Geoms"
+
+
+def parse_text_stats(path, thread="Main"):
+    """
+    Parse text-stats output into a list of frames, each {"frame", "frame_ms",
+    "values": {full collector name: value}}. Names are colon-joined
+    ("Primitive batches:Triangle strips"); counts given in K or M are scaled
+    to units, times stay in ms.
+    """
+    frames = []
+    current = None
+    stack = []
+    with open(path, errors="replace") as f:
+        for line in f:
+            line = line.rstrip("\n").lstrip("\r")
+            header = FRAME_HEADER.match(line)
+            if header:
+                current = None
+                if header.group(1) == thread:
+                    current = {"frame": int(header.group(2)), "frame_ms": float(header.group(3)), "values": {}}
+                    frames.append(current)
+                stack = []
+                continue
+            match = COLLECTOR_LINE.match(line)
+            if current is None or match is None or not match.group(2):
+                continue
+            depth = len(match.group(1)) // 2 - 1
+            del stack[depth:]
+            stack.append(match.group(2))
+            value = float(match.group(3)) * UNIT_SCALE.get(match.group(4), 1.0)
+            current["values"][":".join(stack)] = value
+    return frames
+
+
+def find_text_stats():
+    """
+    Path of the text-stats binary in the panda3d_tools package. The
+    "text-stats" on PATH is a wrapper script that would outlive terminate().
+    """
+    try:
+        import panda3d_tools
+    except ImportError:
+        return "text-stats"
+    path = os.path.join(os.path.dirname(panda3d_tools.__file__), "text-stats.exe" if os.name == "nt" else "text-stats")
+    return path if os.path.exists(path) else "text-stats"
+
+
+def check_draw_calls(frames):
+    """Raise if the draw-call collector is missing or zero in every frame, rather than report 0."""
+    if not any(DRAW_CALL_COLLECTOR in frame["values"] for frame in frames):
+        raise RuntimeError(f"PStats reported no '{DRAW_CALL_COLLECTOR}' collector; cannot count draw calls")
+    if not any(frame["values"].get(DRAW_CALL_COLLECTOR) for frame in frames):
+        raise RuntimeError(f"'{DRAW_CALL_COLLECTOR}' was 0 in every frame; was anything drawn?")
+
+
+def frame_counts(frame):
+    values = frame["values"]
+    draw_calls = values.get(DRAW_CALL_COLLECTOR, 0.0)
+    primitive_ms = values.get("Draw:Primitive", 0.0)  # Time spent drawing the Geoms themselves
+    return {
+        "frame": frame["frame"],
+        "frame_ms": frame["frame_ms"],
+        "draw_calls": draw_calls,
+        "geom_nodes": values.get("Nodes:GeomNodes", 0.0),
+        "primitive_ms": primitive_ms,
+        "primitive_ms_per_draw": primitive_ms / draw_calls if draw_calls else 0.0,
+        "state_changes": values.get("State changes", 0.0),
+        "texture_changes": values.get("State changes:Textures", 0.0),
+        "transform_changes": values.get("State changes:Transforms", 0.0),
+        "cull_ms": values.get("Cull", 0.0),
+        "draw_ms": values.get("Draw", 0.0),
+    }
+
+
+class TextStatsServer:
+    """
+    Panda's console PStats server (text-stats, shipped with the panda3d
+    wheel) running as a subprocess, writing every frame it receives to a
+    temporary file that parse_text_stats() reads back.
+    """
+
+    def __init__(self, port=5186, executable=None):
+        self.port = port
+        self.executable = executable or find_text_stats()
+        self.output_path = None
+        self.process = None
+
+    def start(self):
+        handle, self.output_path = tempfile.mkstemp(prefix="text-stats-", suffix=".txt")
+        os.close(handle)
+        self.process = subprocess.Popen([self.executable, "-p", str(self.port), "-o", self.output_path],
+                                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def connect(self, timeout=10.0):
+        """Connect this process's PStatClient to the server, retrying while it starts up."""
+        deadline = time.monotonic() + timeout
+        while not PStatClient.connect("localhost", self.port):
+            if self.process.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"Could not connect to {self.executable} on port {self.port}")
+            time.sleep(0.2)
+
+    def stop(self, settle=2.0):
+        """Disconnect, give the server time to write the last frames, and return them parsed."""
+        PStatClient.disconnect()
+        # The server writes as frames arrive; wait until the file stops growing
+        size = -1
+        deadline = time.monotonic() + settle * 5
+        while time.monotonic() < deadline:
+            time.sleep(settle / 4)
+            new_size = os.path.getsize(self.output_path)
+            if new_size == size:
+                break
+            size = new_size
+        self.process.terminate()
+        self.process.wait()
+        frames = parse_text_stats(self.output_path)
+        os.remove(self.output_path)
+        return frames
+
+
+def camera_path(center, radius, height, frames):
+    """A closed orbit of `frames` (position, look-at) pairs around `center`."""
+    path = []
+    for i in range(frames):
+        angle = 2.0 * math.pi * i / frames
+        position = Point3(center.x + radius * math.cos(angle), center.y + radius * math.sin(angle), center.z + height)
+        path.append((position, center))
+    return path
+
+
+class RenderBenchmark:
+    """
+    Loads the normal Game scene into an offscreen tinydisplay (software)
+    buffer and flies the camera along a fixed orbit of the town, recording
+    per frame the draw calls, render-state changes and cull/draw time
+    that PStats reports. Nothing needs a GPU, so the effect of batching and
+    culling work can be measured anywhere; tinydisplay is slow (a full frame
+    of the town can take around a second) and lacks some GPU features, such
+    as sRGB textures, so compare runs with each other rather than with
+    hardware numbers. Draw calls are the "Geoms" collector (one per Geom
+    drawn), since tinydisplay leaves "Primitive batches" at zero; a run
+    where it is missing or always zero raises instead of reporting 0.
+    """
+
+    def __init__(self, width=640, height=360, seed=1, port=5186, text_stats=None):
+        loadPrcFileData("render-benchmark", f"win-size {width} {height}\npstats-tcp-ratio 1.0")
+        self.game = Game(headless=True, seed=seed, software_render=True)
+        # A reset mid-flight would move the camera and rebuild the round
+        self.game.hud.stop_timer()
+        self.stats_server = TextStatsServer(port, text_stats)
+        self.trailing_frames = 3
+
+    def break_bottles(self, count, settle_frames=10):
+        """Break `count` bottles first, so the shard geometry is part of the measured scene."""
+        game = self.game
+        for bottle in list(game.bottle_manager.bottles)[:count]:
+            game.gun.hit_bottle(bottle, bottle.node.getPos(game.render))
+        for _ in range(settle_frames):
+            game.taskMgr.step()
+
+    def run(self, frames=60, orbit_scale=0.6, height_scale=0.3, break_count=0):
+        game = self.game
+        clock = ClockObject.getGlobalClock()
+        clock.setMode(ClockObject.MNonRealTime)
+        clock.setFrameRate(60)
+        if break_count:
+            self.break_bottles(break_count)
+
+        bounds = game.model_loader.town.getBounds()
+        center = game.render.getRelativePoint(game.model_loader.town, bounds.getCenter())
+        radius = bounds.getRadius()
+        path = camera_path(center, radius * orbit_scale, radius * height_scale, frames)
+
+        self.stats_server.start()
+        try:
+            self.stats_server.connect()
+            wall_ms = []
+            for position, look_at in path:
+                game.camera.setPos(game.render, position)
+                game.camera.lookAt(game.render, look_at)
+                start = time.perf_counter()
+                game.taskMgr.step()
+                wall_ms.append((time.perf_counter() - start) * 1000.0)
+            # A frame's data goes out during the following frames, so run a few more before disconnecting
+            for _ in range(self.trailing_frames):
+                game.taskMgr.step()
+        finally:
+            reported = self.stats_server.stop()
+
+        # PStats numbers frames from 1 after connecting; drop the trailing ones
+        measured = [frame for frame in reported if 1 <= frame["frame"] <= frames]
+        check_draw_calls(measured)
+        rows = [frame_counts(frame) for frame in measured]
+        summary = {key: percentiles([row[key] for row in rows])
+                   for key in ("draw_calls", "primitive_ms_per_draw", "state_changes", "cull_ms", "draw_ms")}
+        summary["wall_frame_ms"] = percentiles(wall_ms)
+        return {
+            "frames": frames,
+            "frames_reported": len(rows),  # PStats may drop a frame now and then
+            "window": [game.win.getXSize(), game.win.getYSize()],
+            "bottles": len(game.bottle_manager.bottles),
+            "live_shards": game.physics.shard_pool.get_stats()["live"],
+            "summary": summary,
+            "per_frame": rows,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Software-rendered draw-call and state-change benchmark.")
+    parser.add_argument("--frames", type=int, default=60, help="frames along the camera orbit (default: 60)")
+    parser.add_argument("--size", default="640x360", help="offscreen buffer size (default: 640x360)")
+    parser.add_argument("--break-bottles", type=int, default=0, metavar="N",
+                        help="break N bottles before flying, to include shard geometry")
+    parser.add_argument("--port", type=int, default=5186, help="port for the private PStats server")
+    parser.add_argument("--text-stats", default=None, help="path to the text-stats executable (default: panda3d's)")
+    parser.add_argument("--output", metavar="FILE", help="write the results as JSON to FILE instead of stdout")
+    args = parser.parse_args()
+
+    width, height = (int(part) for part in args.size.lower().split("x"))
+    result = RenderBenchmark(width, height, port=args.port, text_stats=args.text_stats).run(
+        args.frames, break_count=args.break_bottles)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {result['frames_reported']} frames to {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(result, indent=2))
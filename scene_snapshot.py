@@ -0,0 +1,47 @@
+import time
+
+from panda3d.core import Vec3
+
+
+class SceneSnapshot:
+    """
+    The dynamic state of a round as it was right after setup: every bottle's
+    transform and tint, the player and camera transforms and the HUD counters.
+    restore() puts that state back in place, reusing the world, the loaded
+    models, the shapes and the running tasks, so a reset costs milliseconds.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self.capture()
+
+    def capture(self):
+        game = self.game
+        self.bottles = [(bottle, bottle.node.getTransform(), bottle.node.getColorScale())
+                        for bottle in game.bottle_manager.get_all_bottles() if not bottle.destroyed]
+        # Player bodies and the camera: (NodePath, transform) pairs
+        self.nodes = [(node_path, node_path.getTransform()) for node_path in (
+            game.controls.player_np, game.camera, game.model_loader.player_node_path,
+            game.player_physics.bullet_node_path) if node_path is not None and not node_path.isEmpty()]
+        self.bottles_total = game.hud.bottles_total
+
+    def restore(self):
+        """Put the captured state back. Returns the time it took in milliseconds."""
+        start = time.perf_counter()
+        game = self.game
+        for bottle, transform, color_scale in self.bottles:
+            bottle.restore(transform, color_scale)
+        game.bottle_manager.bottles = [bottle for bottle, _, _ in self.bottles]
+        game.bottle_manager.lights.refresh()
+
+        for node_path, transform in self.nodes:
+            node_path.setTransform(transform)
+            body = node_path.node()
+            if hasattr(body, "setLinearVelocity"):
+                body.setLinearVelocity(Vec3(0, 0, 0))
+                body.setAngularVelocity(Vec3(0, 0, 0))
+                body.clearForces()
+
+        game.hud.bottles_total = self.bottles_total
+        game.hud.reset()
+        return (time.perf_counter() - start) * 1000.0
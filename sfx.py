@@ -1,70 +1,188 @@
-from panda3d.core import Point3
+from panda3d.core import AudioSound, Point3
 from direct.showbase import Audio3DManager
+from collections import namedtuple
 import os
 import random
+from game_log import get_logger
+
+log = get_logger(__name__)
+
+# path: sample file, loaded once; voices: how many copies may play at once;
+# priority: higher steals from lower; positional: 3D sound; pitch_variation: random play rate spread
+SoundSpec = namedtuple("SoundSpec", ["path", "voices", "priority", "positional", "pitch_variation"])
+
+# Every effect the game plays, preloaded when SFX is created
+SOUNDS = {
+    "shoot": SoundSpec("shoot.wav", 4, 2, False, 0.0),
+    "shell": SoundSpec("shell.wav", 4, 0, False, 0.0),
+    "bottle_break": SoundSpec(os.path.join("sounds", "break.wav"), 8, 1, True, 0.2),
+}
+
+
+class Voice:
+    """One playable copy of a sound and what it was last started for."""
+
+    __slots__ = ("sound", "priority", "position", "started")
+
+    def __init__(self, sound):
+        self.sound = sound
+        self.priority = 0
+        self.position = None
+        self.started = 0.0
+
+    def is_playing(self):
+        return self.sound.status() == AudioSound.PLAYING
+
+
+class VoicePool:
+    """
+    A fixed set of voices for one sound, all sharing the sample the audio
+    manager loaded once. A play takes a free voice; when every voice is busy
+    it steals the least important one (lowest priority, then farthest from
+    the listener, then oldest), or is dropped if it matters less than all of them.
+    """
+
+    def __init__(self, name, spec, sounds):
+        self.name = name
+        self.spec = spec
+        self.voices = [Voice(sound) for sound in sounds]
+        self.plays = 0
+        self.steals = 0
+        self.dropped = 0
+        self.peak_active = 0
+
+    def acquire(self, priority, distance, listener):
+        """Return a voice to play on (stopping whatever it played), or None to drop the play."""
+        active = 0
+        free = None
+        for voice in self.voices:
+            if voice.is_playing():
+                active += 1
+            elif free is None:
+                free = voice
+        self.peak_active = max(self.peak_active, active + 1 if free else active)
+        if free is not None:
+            return free
+
+        def importance(voice):
+            voice_distance = (voice.position - listener).length() if voice.position is not None else 0.0
+            return (voice.priority, -voice_distance, voice.started)
+
+        victim = min(self.voices, key=importance)
+        if (priority, -distance) < importance(victim)[:2]:
+            self.dropped += 1
+            return None
+        victim.sound.stop()
+        self.steals += 1
+        return victim
+
+    def stop(self):
+        for voice in self.voices:
+            voice.sound.stop()
+
+    def get_stats(self):
+        return {
+            "voices": len(self.voices),
+            "active": sum(1 for voice in self.voices if voice.is_playing()),
+            "peak_active": self.peak_active,
+            "plays": self.plays,
+            "steals": self.steals,
+            "dropped": self.dropped,
+        }
+
 
 class SFX:
-    def __init__(self, base):
+    def __init__(self, base, sounds=SOUNDS):
         self.base = base
-        self.sounds = {}
+        self.pools = {}
         # Initialize Audio3DManager with the first sfxManager and the camera
         self.audio3d = Audio3DManager.Audio3DManager(base.sfxManagerList[0], base.camera)
+        # Load every effect up front, so playing one never touches the disk
+        for sound_name, spec in sounds.items():
+            self.load_sound(sound_name, spec)
 
-    def load_sound(self, sound_name, sound_file):
-        """Load a sound effect from a file."""
-        if sound_name not in self.sounds:
-            sound_path = os.path.join("sounds", sound_file)  # Assuming sounds are in a folder named "sounds"
-            if not os.path.exists(sound_path):
-                print(f"Warning: Sound file '{sound_file}' does not exist!")
+    def load_sound(self, sound_name, spec):
+        """Load a sound effect once, as a pool of spec.voices voices. Returns the VoicePool."""
+        if sound_name not in self.pools:
+            if not os.path.exists(spec.path):
+                log.warning("Sound file '%s' does not exist!", spec.path)
                 return None
-            # Load the sound using Audio3DManager's loadSfx method
-            sound = self.audio3d.loadSfx(sound_path)
-            self.sounds[sound_name] = sound
-            print(f"Sound '{sound_name}' loaded successfully.")
-        return self.sounds.get(sound_name)
-
-    def play_sound(self, sound_name, position=Point3(0, 0, 0), loop=False, volume=1.0, play_rate=1.0, balance=0.0, max_dist=10.0, min_dist=0.1):
-        """Play the sound at a specific position in 3D space with added options for variation."""
-        sound = self.sounds.get(sound_name)
-        if not sound:
-            print(f"Error: Sound '{sound_name}' not loaded.")
-            return
+            # The audio manager caches the sample, so the extra voices share it
+            load = self.audio3d.loadSfx if spec.positional else self.base.loader.loadSfx
+            self.pools[sound_name] = VoicePool(sound_name, spec, [load(spec.path) for _ in range(spec.voices)])
+            log.debug("Sound '%s' loaded successfully (%d voices).", sound_name, spec.voices)
+        return self.pools.get(sound_name)
+
+    def listener_pos(self):
+        return self.base.camera.getPos(self.base.render)
+
+    def play_sound(self, sound_name, position=None, loop=False, volume=1.0, play_rate=1.0, balance=0.0,
+                   max_dist=10.0, min_dist=0.1, priority=None):
+        """
+        Play the sound on a free voice of its pool, at `position` in 3D space for
+        positional sounds. `priority` overrides the sound's default when voices
+        have to be stolen. Returns the AudioSound, or None if the play was dropped.
+        """
+        pool = self.pools.get(sound_name)
+        if not pool:
+            log.error("Sound '%s' not loaded.", sound_name)
+            return None
+
+        spec = pool.spec
+        priority = spec.priority if priority is None else priority
+        listener = self.listener_pos()
+        distance = (position - listener).length() if position is not None else 0.0
+        voice = pool.acquire(priority, distance, listener)
+        if voice is None:
+            return None
+        voice.priority = priority
+        voice.position = Point3(position) if position is not None else None
+        voice.started = globalClock.getFrameTime()
+        pool.plays += 1
 
         # Set various properties for the sound
+        sound = voice.sound
         sound.set_volume(volume)
         sound.set_balance(balance)  # Balance the sound between left and right
         sound.set_loop(loop)  # Loop the sound
         sound.set_loop_count(0 if loop else 1)  # Loop indefinitely if requested
-        sound.set3dMaxDistance(max_dist)  # Set maximum distance for sound falloff
-        sound.set3dMinDistance(min_dist)  # Set minimum distance for sound falloff
 
-        # Set the sound's 3D position and velocity
-        sound.set3dAttributes(position.get_x(), position.get_y(), position.get_z(), 0, 0, 0)  # You can modify the velocity as needed
+        if spec.positional:
+            sound.set3dMaxDistance(max_dist)  # Set maximum distance for sound falloff
+            sound.set3dMinDistance(min_dist)  # Set minimum distance for sound falloff
 
-        # Add subtle play rate variation to the sound when the bottle breaks (randomization)
-        sound.setPlayRate(play_rate * random.uniform(0.8, 1.2))  # Variation from 90% to 110% of the original play rate
+            # Set the sound's 3D position and velocity
+            position = position if position is not None else listener
+            # Not attached to a node: Audio3DManager's update task would move it there every frame
+            sound.set3dAttributes(position.get_x(), position.get_y(), position.get_z(), 0, 0, 0)  # You can modify the velocity as needed
+
+        # Add subtle play rate variation (e.g. to the sound when the bottle breaks)
+        variation = spec.pitch_variation
+        sound.setPlayRate(play_rate * random.uniform(1.0 - variation, 1.0 + variation) if variation else play_rate)
 
-        # Attach the sound to the camera (or another object, if desired)
-        self.audio3d.attachSoundToObject(sound, self.base.camera)
-        
         # Play the sound
         sound.play()
-        print(f"Playing sound '{sound_name}' at position {position}.")
+        log.debug("Playing sound '%s' at position %s.", sound_name, position)
+        return sound
 
     def stop_sound(self, sound_name):
-        """Stop a specific sound by name."""
-        sound = self.sounds.get(sound_name)
-        if sound:
-            sound.stop()
-            print(f"Stopped sound '{sound_name}'.")
+        """Stop every voice of a specific sound by name."""
+        pool = self.pools.get(sound_name)
+        if pool:
+            pool.stop()
+            log.debug("Stopped sound '%s'.", sound_name)
 
     def stop_all_sounds(self):
         """Stop all sounds."""
-        for sound in self.sounds.values():
-            sound.stop()
-        print("Stopped all sounds.")
+        for pool in self.pools.values():
+            pool.stop()
+        log.debug("Stopped all sounds.")
+
+    def get_stats(self):
+        """Voice usage per sound."""
+        return {sound_name: pool.get_stats() for sound_name, pool in self.pools.items()}
 
 # Example usage:
-# sfx = SFX(base)  # Assuming base is the main Panda3D instance
-# sfx.load_sound("bottle_break", "break.wav")
-# sfx.play_sound("bottle_break", position=Point3(10, 0, 0), volume=0.8, play_rate=1.0)
+# sfx = SFX(base)  # Assuming base is the main Panda3D instance; every sound in SOUNDS is preloaded
+# sfx.play_sound("bottle_break", position=Point3(10, 0, 0), volume=0.8)
+# sfx.play_sound("shoot", priority=3)
@@ -0,0 +1,140 @@
+import numpy as np
+from panda3d.core import Geom, GeomNode, GeomVertexData, GeomVertexFormat, GeomVertexArrayFormat
+from panda3d.core import GeomVertexArrayData, GeomVertexAnimationSpec, GeomTriangles, InternalName
+from panda3d.core import TransformBlend, TransformBlendTable, UserVertexTransform, SparseArray
+from panda3d.core import OmniBoundingVolume, LMatrix4f
+
+
+def make_shard_batch_format():
+    """
+    Vertex format for batched shards: array 0 holds positions plus a per-vertex
+    transform index (shared by every break using the same template), array 1
+    holds per-vertex colors (written per break).
+    """
+    geometry = GeomVertexArrayFormat()
+    geometry.addColumn(InternalName.getVertex(), 3, Geom.NT_float32, Geom.C_point)
+    geometry.addColumn(InternalName.getTransformBlend(), 1, Geom.NT_uint16, Geom.C_index)
+    colors = GeomVertexArrayFormat()
+    colors.addColumn(InternalName.getColor(), 4, Geom.NT_uint8, Geom.C_color)
+
+    vertex_format = GeomVertexFormat()
+    vertex_format.addArray(geometry)
+    vertex_format.addArray(colors)
+    animation = GeomVertexAnimationSpec()
+    animation.setPanda()
+    vertex_format.setAnimation(animation)
+    return GeomVertexFormat.registerFormat(vertex_format)
+
+
+SHARD_BATCH_FORMAT = make_shard_batch_format()
+
+
+def array_dtype(array_format):
+    """Build a NumPy structured dtype matching a Panda vertex array format."""
+    names, formats, offsets = [], [], []
+    for i in range(array_format.getNumColumns()):
+        column = array_format.getColumn(i)
+        kind = {Geom.NT_float32: np.float32, Geom.NT_uint16: np.uint16, Geom.NT_uint8: np.uint8}[column.getNumericType()]
+        names.append(column.getName().getName())
+        formats.append((kind, column.getNumComponents()) if column.getNumComponents() > 1 else kind)
+        offsets.append(column.getStart())
+    return np.dtype({"names": names, "formats": formats, "offsets": offsets, "itemsize": array_format.getStride()})
+
+
+def build_batch_arrays(template):
+    """
+    Build the shareable part of a template's batched geometry: the vertex array
+    (positions + transform index) and the triangle list for all its shards.
+    """
+    geometry_format = SHARD_BATCH_FORMAT.getArray(0)
+    rows = np.zeros(len(template.vertices), dtype=array_dtype(geometry_format))
+    rows["vertex"] = template.vertices
+    rows["transform_blend"] = np.repeat(
+        np.arange(template.shard_count, dtype=np.uint16), np.diff(template.vertex_offsets))
+    vertex_array = GeomVertexArrayData(geometry_format, Geom.UHStatic)
+    vertex_array.modifyHandle().copyDataFrom(rows.tobytes())
+
+    triangles = GeomTriangles(Geom.UHStatic)
+    triangles.setIndexType(Geom.NT_uint32)
+    triangles.modifyVertices().modifyHandle().copyDataFrom(template.triangles.astype(np.uint32).tobytes())
+    return vertex_array, triangles
+
+
+class ShardBatch:
+    """
+    All shards from one break rendered as a single Geom with one render state.
+    Each shard's vertices are bound to an entry of a transform table; update()
+    copies the rigid body transforms into that table once per frame and Panda
+    applies them in one animation pass, instead of one node (and one draw call)
+    per shard.
+    """
+
+    def __init__(self, template, body_nodes, colors, parent, name="shard_batch", geom_node=None):
+        self.template = template
+        self.body_nodes = list(body_nodes)  # None once a slot's shard is released
+        self.scales = [1.0] * len(self.body_nodes)
+        self.live_count = len(self.body_nodes)
+
+        vertex_array, triangles = template.get_batch_arrays()
+        vertex_data = GeomVertexData(name, SHARD_BATCH_FORMAT, Geom.UHStatic)
+        vertex_data.setArray(0, vertex_array)  # Shared with every other break of this template
+        vertex_data.setArray(1, self.make_color_array(colors))
+
+        self.transforms = [UserVertexTransform(body.getName()) for body in self.body_nodes]
+        blend_table = TransformBlendTable()
+        for transform in self.transforms:
+            blend_table.addBlend(TransformBlend(transform, 1.0))
+        blend_table.setRows(SparseArray.lowerOn(len(template.vertices)))
+        vertex_data.setTransformBlendTable(blend_table)
+
+        geom = Geom(vertex_data)
+        geom.addPrimitive(triangles)
+        if geom_node is None:
+            geom_node = GeomNode(name)
+        geom_node.removeAllGeoms()
+        geom_node.addGeom(geom)
+        # Shards scatter far from where the batch node sits, so never cull on stale bounds
+        geom_node.setBounds(OmniBoundingVolume())
+        geom_node.setFinal(True)
+        self.node_path = parent.attachNewNode(geom_node)
+        self.update(force=True)
+
+    def update(self, force=False):
+        """Copy the shard body transforms into the transform table."""
+        for transform, body, scale in zip(self.transforms, self.body_nodes, self.scales):
+            # Sleeping bodies don't move, so their table entry is already current
+            if body is None or not (force or body.isActive() or scale < 1.0):
+                continue
+            if scale < 1.0:
+                transform.setMatrix(LMatrix4f.scaleMat(scale) * body.getTransform().getMat())
+            else:
+                transform.setMatrix(body.getTransform().getMat())
+
+    def set_shard_scale(self, index, scale):
+        """Shrink one shard in place, e.g. while it fades out."""
+        self.scales[index] = scale
+
+    def release_shard(self, index):
+        """Hide a shard's slot; its body may be reused by another break."""
+        if self.body_nodes[index] is None:
+            return
+        self.body_nodes[index] = None
+        self.transforms[index].setMatrix(LMatrix4f.scaleMat(0))
+        self.live_count -= 1
+
+    def make_color_array(self, colors):
+        """Expand one RGBA color (0..1) per shard into the per-vertex color array."""
+        color_format = SHARD_BATCH_FORMAT.getArray(1)
+        rows = np.zeros(len(self.template.vertices), dtype=array_dtype(color_format))
+        rows["color"] = np.repeat(
+            np.clip(np.asarray(colors) * 255, 0, 255).astype(np.uint8), np.diff(self.template.vertex_offsets), axis=0)
+        color_array = GeomVertexArrayData(color_format, Geom.UHStatic)
+        color_array.modifyHandle().copyDataFrom(rows.tobytes())
+        return color_array
+
+    def remove(self):
+        """Remove the batch geometry from the scene and return its GeomNode for reuse."""
+        geom_node = self.node_path.node()
+        geom_node.removeAllGeoms()
+        self.node_path.detachNode()
+        return geom_node
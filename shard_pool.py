@@ -0,0 +1,208 @@
+import numpy as np
+from panda3d.core import GeomNode, Vec3
+from panda3d.bullet import BulletRigidBodyNode
+from collision_manager import set_collision_group
+
+
+class Shard:
+    """One live piece of debris: a pooled rigid body plus where it is drawn."""
+
+    __slots__ = ("body_np", "body", "geom_np", "batch", "index", "spawn_time", "rest_time")
+
+    def __init__(self, body_np):
+        self.body_np = body_np
+        self.body = body_np.node()
+        self.geom_np = None  # Own GeomNode child (unbatched mode)
+        self.batch = None  # ShardBatch slot (batched mode)
+        self.index = -1
+        self.spawn_time = 0.0
+        self.rest_time = None
+
+
+# Body properties restored from a pristine node whenever a body is recycled
+RESET_PROPERTIES = (
+    "LinearDamping", "AngularDamping", "Friction", "Restitution", "CcdMotionThreshold",
+    "CcdSweptSphereRadius", "ContactProcessingThreshold", "LinearSleepThreshold",
+    "AngularSleepThreshold", "LinearFactor", "AngularFactor",
+)
+
+
+class ShardPool:
+    """
+    Recycles shard rigid bodies and GeomNodes under a global live-shard budget.
+    When the budget is full the oldest (or farthest from `reference`) debris is
+    evicted; shards that have come to rest shrink out and despawn after
+    `rest_despawn_delay` seconds.
+    """
+
+    def __init__(self, bullet_world, render, max_live_shards=1024, rest_despawn_delay=3.0,
+                 fade_time=1.0, eviction="oldest", reference=None):
+        self.bullet_world = bullet_world
+        self.render = render
+        self.max_live_shards = max_live_shards
+        self.rest_despawn_delay = rest_despawn_delay
+        self.fade_time = fade_time
+        self.eviction = eviction  # "oldest" or "farthest"
+        self.reference = reference  # NodePath distances are measured from, e.g. the camera
+        pristine = BulletRigidBodyNode("pristine")
+        self.defaults = {name: getattr(pristine, "get" + name)() for name in RESET_PROPERTIES}
+
+        self.live = []  # Live shards in spawn order
+        self.free_shards = []
+        self.free_batch_nodes = []
+        self.batches = []
+
+        self.allocated = 0
+        self.reused = 0
+        self.evicted = 0
+        self.despawned = 0
+        self.peak_live = 0
+
+    def acquire(self, shape, mass, position, geom=None, color=None):
+        """
+        Return a Shard whose body carries `shape`, is attached to the world at
+        `position` and has default dynamics. If `geom` is given the shard gets
+        its own GeomNode showing it (the unbatched rendering path).
+        """
+        if len(self.live) >= self.max_live_shards:
+            self.make_room(1)
+
+        if self.free_shards:
+            shard = self.free_shards.pop()
+            shard.body_np.reparentTo(self.render)
+            self.reused += 1
+        else:
+            shard = Shard(self.render.attachNewNode(BulletRigidBodyNode("shard")))
+            self.allocated += 1
+        self.reset_body(shard.body, shape, mass)
+
+        shard.body_np.setPosHprScale(position, Vec3(0, 0, 0), Vec3(1, 1, 1))
+        if geom is not None:
+            if shard.geom_np is None:
+                shard.geom_np = shard.body_np.attachNewNode(GeomNode("shard_geom"))
+            shard.geom_np.node().removeAllGeoms()
+            shard.geom_np.node().addGeom(geom)
+            shard.geom_np.setScale(1)
+            shard.geom_np.show()
+            if color is not None:
+                shard.geom_np.setColor(*color)
+        elif shard.geom_np is not None:
+            shard.geom_np.hide()
+
+        self.bullet_world.attachRigidBody(shard.body)
+        shard.spawn_time = globalClock.getFrameTime()
+        shard.rest_time = None
+        self.live.append(shard)
+        self.peak_live = max(self.peak_live, len(self.live))
+        return shard
+
+    def reset_body(self, body, shape, mass):
+        """Strip a recycled body back to a plain dynamic shard with a single shape."""
+        while body.getNumShapes():
+            body.removeShape(body.getShape(0))
+        body.addShape(shape)
+        body.setMass(mass)
+        set_collision_group(body, "shard")
+        body.clearForces()
+        body.setLinearVelocity(Vec3(0, 0, 0))
+        body.setAngularVelocity(Vec3(0, 0, 0))
+        body.setGravity(self.bullet_world.getGravity())
+        for name, value in self.defaults.items():
+            getattr(body, "set" + name)(value)
+        body.setDeactivationEnabled(True)
+        body.setActive(True, True)
+
+    def release(self, shard):
+        """Take a shard out of the world and keep its body and GeomNode for reuse."""
+        self.bullet_world.removeRigidBody(shard.body)
+        if shard.batch is not None:
+            shard.batch.release_shard(shard.index)
+            shard.batch = None
+        shard.body_np.detachNode()
+        self.free_shards.append(shard)
+
+    def make_room(self, count):
+        """Evict debris until `count` more shards fit in the budget."""
+        excess = len(self.live) + count - self.max_live_shards
+        if excess <= 0:
+            return
+        excess = min(excess, len(self.live))
+        if self.eviction == "farthest" and self.reference is not None:
+            origin = self.reference.getPos(self.render)
+            positions = np.array([shard.body_np.getPos() for shard in self.live])
+            distances = np.linalg.norm(positions - np.array(origin), axis=1)
+            doomed = set(np.argsort(distances)[-excess:].tolist())
+            victims = [shard for i, shard in enumerate(self.live) if i in doomed]
+            self.live = [shard for i, shard in enumerate(self.live) if i not in doomed]
+        else:
+            victims, self.live = self.live[:excess], self.live[excess:]
+        for shard in victims:
+            self.release(shard)
+        self.evicted += len(victims)
+
+    def take_batch_node(self):
+        """Return a recycled batch GeomNode, or None if the pool has none."""
+        return self.free_batch_nodes.pop() if self.free_batch_nodes else None
+
+    def add_batch(self, batch, shards):
+        """Bind each shard to its slot in a batch so releasing it hides that slot."""
+        for index, shard in enumerate(shards):
+            shard.batch = batch
+            shard.index = index
+        self.batches.append(batch)
+
+    def update(self):
+        """Fade out and despawn resting shards, then refresh and retire batches."""
+        now = globalClock.getFrameTime()
+        survivors = []
+        for shard in self.live:
+            if shard.body.isActive():
+                shard.rest_time = None
+            elif shard.rest_time is None:
+                shard.rest_time = now
+
+            scale = 1.0
+            if shard.rest_time is not None:
+                scale = 1.0 - (now - shard.rest_time - self.rest_despawn_delay) / self.fade_time
+            if scale <= 0.0:
+                self.release(shard)
+                self.despawned += 1
+                continue
+            if scale < 1.0:
+                if shard.batch is not None:
+                    shard.batch.set_shard_scale(shard.index, scale)
+                elif shard.geom_np is not None:
+                    shard.geom_np.setScale(scale)
+            survivors.append(shard)
+        self.live = survivors
+
+        batches = []
+        for batch in self.batches:
+            if batch.live_count:
+                batch.update()
+                batches.append(batch)
+            else:
+                self.free_batch_nodes.append(batch.remove())
+        self.batches = batches
+
+    def clear(self):
+        """Release every live shard and batch."""
+        for shard in self.live:
+            self.release(shard)
+        self.live = []
+        for batch in self.batches:
+            self.free_batch_nodes.append(batch.remove())
+        self.batches = []
+
+    def get_stats(self):
+        return {
+            "live": len(self.live),
+            "free": len(self.free_shards),
+            "peak_live": self.peak_live,
+            "budget": self.max_live_shards,
+            "batches": len(self.batches),
+            "allocated": self.allocated,
+            "reused": self.reused,
+            "evicted": self.evicted,
+            "despawned": self.despawned,
+        }
@@ -0,0 +1,115 @@
+import math
+
+from panda3d.core import Point3
+
+
+class SpatialHash:
+    """
+    Uniform-grid index of point-like items (bottles) keyed by integer cell
+    coordinates. Radius and segment queries only visit the cells they overlap,
+    so their cost follows the local item density instead of the total count.
+    """
+
+    def __init__(self, cell_size=8.0):
+        self.cell_size = float(cell_size)
+        self.cells = {}  # (i, j, k) -> set of items
+        self.positions = {}  # item -> (cell, Point3)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def cell_of(self, pos):
+        size = self.cell_size
+        return (math.floor(pos[0] / size), math.floor(pos[1] / size), math.floor(pos[2] / size))
+
+    def insert(self, item, pos):
+        """Add an item at `pos`, or move it there if it is already indexed."""
+        if item in self.positions:
+            self.move(item, pos)
+            return
+        cell = self.cell_of(pos)
+        self.cells.setdefault(cell, set()).add(item)
+        self.positions[item] = (cell, Point3(pos))
+
+    def move(self, item, pos):
+        """Update an indexed item's position; only touches the grid if it changed cell."""
+        old_cell, _ = self.positions[item]
+        cell = self.cell_of(pos)
+        if cell != old_cell:
+            self.discard_from_cell(item, old_cell)
+            self.cells.setdefault(cell, set()).add(item)
+        self.positions[item] = (cell, Point3(pos))
+
+    def remove(self, item):
+        """Drop an item from the index (no-op if it isn't indexed)."""
+        entry = self.positions.pop(item, None)
+        if entry is not None:
+            self.discard_from_cell(item, entry[0])
+
+    def discard_from_cell(self, item, cell):
+        items = self.cells.get(cell)
+        if items is not None:
+            items.discard(item)
+            if not items:
+                del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.positions.clear()
+
+    def get_pos(self, item):
+        return self.positions[item][1]
+
+    def items_in_box(self, low, high):
+        """Yield the items of every cell overlapping the box low..high."""
+        (i0, j0, k0), (i1, j1, k1) = self.cell_of(low), self.cell_of(high)
+        for i in range(i0, i1 + 1):
+            for j in range(j0, j1 + 1):
+                for k in range(k0, k1 + 1):
+                    items = self.cells.get((i, j, k))
+                    if items:
+                        yield from items
+
+    def query_radius(self, center, radius):
+        """Return the items within `radius` of `center`, nearest first."""
+        center = Point3(center)
+        pad = Point3(radius, radius, radius)
+        found = []
+        for item in self.items_in_box(center - pad, center + pad):
+            distance = (self.positions[item][1] - center).length()
+            if distance <= radius:
+                found.append((distance, item))
+        found.sort(key=lambda entry: entry[0])
+        return [item for _, item in found]
+
+    def query_segment(self, start, end, radius):
+        """
+        Return the items within `radius` of the segment start..end, ordered by
+        how far along the segment they are. Meant for short segments such as a
+        projectile's movement over one frame.
+        """
+        start, end = Point3(start), Point3(end)
+        pad = Point3(radius, radius, radius)
+        low = Point3(min(start[0], end[0]), min(start[1], end[1]), min(start[2], end[2])) - pad
+        high = Point3(max(start[0], end[0]), max(start[1], end[1]), max(start[2], end[2])) + pad
+
+        direction = end - start
+        length_sq = direction.lengthSquared()
+        found = []
+        for item in self.items_in_box(low, high):
+            pos = self.positions[item][1]
+            t = 0.0 if length_sq == 0 else min(max((pos - start).dot(direction) / length_sq, 0.0), 1.0)
+            if (pos - (start + direction * t)).length() <= radius:
+                found.append((t, item))
+        found.sort(key=lambda entry: entry[0])
+        return [item for _, item in found]
+
+    def get_stats(self):
+        return {
+            "items": len(self.positions),
+            "cells": len(self.cells),
+            "cell_size": self.cell_size,
+        }
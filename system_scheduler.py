@@ -0,0 +1,103 @@
+import time
+from collections import namedtuple
+
+from panda3d.core import PStatCollector
+
+# Per-frame phases, run in this order
+PHASES = ("input", "simulation", "hit_resolution", "presentation")
+
+System = namedtuple("System", ["name", "callback"])
+
+
+class PhaseStats:
+    """Timing counters for one phase (milliseconds)."""
+
+    __slots__ = ("last_ms", "total_ms", "peak_ms", "frames", "over_budget")
+
+    def __init__(self):
+        self.last_ms = 0.0
+        self.total_ms = 0.0
+        self.peak_ms = 0.0
+        self.frames = 0
+        self.over_budget = 0
+
+    def add(self, elapsed_ms, budget_ms=None):
+        self.last_ms = elapsed_ms
+        self.total_ms += elapsed_ms
+        self.peak_ms = max(self.peak_ms, elapsed_ms)
+        self.frames += 1
+        if budget_ms is not None and elapsed_ms > budget_ms:
+            self.over_budget += 1
+
+    def as_dict(self):
+        return {
+            "last_ms": self.last_ms,
+            "mean_ms": self.total_ms / self.frames if self.frames else 0.0,
+            "peak_ms": self.peak_ms,
+            "over_budget": self.over_budget,
+        }
+
+
+class SystemScheduler:
+    """
+    Runs every per-frame system from a single Panda task, phase by phase in
+    PHASES order and, within a phase, in registration order. Each system is
+    a callable taking dt. Every phase and the whole frame keep timing
+    counters and count the frames that went over their budget. Phases show
+    up in PStats as "Game:Systems:<phase>", and an optional FrameProfiler
+    gets every phase and frame time.
+    """
+
+    def __init__(self, task_mgr, frame_budget_ms=1000.0 / 60.0, phase_budgets_ms=None, sort=0, profiler=None):
+        self.task_mgr = task_mgr
+        self.profiler = profiler
+        self.frame_budget_ms = frame_budget_ms
+        self.phase_budgets_ms = dict(phase_budgets_ms or {})
+        self.phases = {phase: [] for phase in PHASES}
+        self.phase_stats = {phase: PhaseStats() for phase in PHASES}
+        self.frame_stats = PhaseStats()
+        self.collectors = {phase: PStatCollector(f"Game:Systems:{phase}") for phase in PHASES}
+        self.task = task_mgr.add(self.step, "systems", sort=sort)
+
+    def add_system(self, phase, name, callback):
+        """Run `callback(dt)` every frame in `phase`. Names must be unique."""
+        if phase not in self.phases:
+            raise ValueError(f"Unknown phase '{phase}', expected one of {PHASES}")
+        self.remove_system(name)
+        self.phases[phase].append(System(name, callback))
+
+    def remove_system(self, name):
+        for systems in self.phases.values():
+            systems[:] = [system for system in systems if system.name != name]
+
+    def get_systems(self):
+        """Return {phase: [system names]} in run order."""
+        return {phase: [system.name for system in systems] for phase, systems in self.phases.items()}
+
+    def step(self, task):
+        dt = globalClock.getDt()
+        frame_start = time.perf_counter()
+        for phase in PHASES:
+            collector = self.collectors[phase]
+            collector.start()
+            phase_start = time.perf_counter()
+            for system in self.phases[phase]:
+                system.callback(dt)
+            elapsed = (time.perf_counter() - phase_start) * 1000.0
+            collector.stop()
+            self.phase_stats[phase].add(elapsed, self.phase_budgets_ms.get(phase))
+            if self.profiler is not None:
+                self.profiler.add_phase(phase, elapsed)
+        frame_elapsed = (time.perf_counter() - frame_start) * 1000.0
+        self.frame_stats.add(frame_elapsed, self.frame_budget_ms)
+        if self.profiler is not None:
+            self.profiler.end_frame(frame_elapsed)
+        return task.cont
+
+    def stop(self):
+        self.task_mgr.remove(self.task)
+
+    def get_stats(self):
+        stats = {phase: self.phase_stats[phase].as_dict() for phase in PHASES}
+        stats["frame"] = dict(self.frame_stats.as_dict(), budget_ms=self.frame_budget_ms)
+        return stats